@@ -1,7 +1,11 @@
 import streamlit as st
 import json
 from post_optimizer import PostOptimizer
+from server_client import ServerClient
+from single_flight import SingleFlight
 from config import Config
+from history_store import HistoryStore
+import datetime
 import os
 
 # Configuração da página
@@ -11,6 +15,91 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def get_history() -> HistoryStore:
+    """Histórico SQLite compartilhado por todas as sessões (None com HISTORY desativado)"""
+    return HistoryStore(Config.HISTORY_PATH) if Config.HISTORY else None
+
+@st.cache_resource
+def get_optimizer() -> PostOptimizer:
+    """
+    Agente compartilhado por todas as sessões (modelo, cache e limitador já aquecidos)
+
+    Há um único agente por processo, para que todas as sessões dividam o mesmo
+    limitador de taxa e a mesma pausa global após um 429; a opção de cache de
+    cada sessão é passada a cada chamada.
+
+    Com SERVER_URL, os pedidos vão ao server.py na classe 'interactive', à
+    frente dos lotes 'bulk' que outros clientes enviam ao mesmo servidor.
+    """
+    if Config.SERVER_URL:
+        return ServerClient(Config.SERVER_URL, priority='interactive')
+    return PostOptimizer(hedging=Config.HEDGING, history=get_history())
+
+@st.cache_resource
+def get_single_flight() -> SingleFlight:
+    """Coalescência de pedidos idênticos feitos ao mesmo tempo por diferentes usuários"""
+    return SingleFlight()
+
+def render_history(history: HistoryStore):
+    """Consulta paginada do histórico; filtros, contagens e médias são calculados no SQLite"""
+    st.subheader("📚 Histórico de otimizações")
+    if history is None:
+        st.info("O histórico está desativado. Defina HISTORY=1 no arquivo .env para ativá-lo.")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        platforms = st.multiselect("📱 Plataformas", ["instagram", "linkedin", "twitter"])
+        text = st.text_input("🔎 Buscar nas descrições", placeholder="Ex: marketing digital")
+    with col2:
+        today = datetime.date.today()
+        period = st.date_input("📅 Período", value=(today - datetime.timedelta(days=30), today))
+        only_success = st.checkbox("✅ Apenas otimizações bem-sucedidas", value=True)
+    with col3:
+        metric = st.selectbox(
+            "📊 Filtrar por métrica",
+            ["(nenhuma)", "question_count", "hashtag_count", "emoji_count", "exclamation_count", "optimized_length"]
+        )
+        minimum = st.number_input("Mínimo", min_value=0, value=0, step=1, disabled=metric == "(nenhuma)")
+        maximum = st.number_input("Máximo", min_value=0, value=100000, step=1, disabled=metric == "(nenhuma)")
+    
+    filters = {
+        'platform': platforms or None,
+        'text': text.strip() or None,
+        'success': True if only_success else None,
+        'metrics': {metric: (minimum, maximum)} if metric != "(nenhuma)" else None
+    }
+    # Enquanto o usuário escolhe o período, o date_input retorna só a data inicial
+    if period:
+        start_date = period[0] if isinstance(period, (tuple, list)) else period
+        end_date = period[1] if isinstance(period, (tuple, list)) and len(period) > 1 else start_date
+        filters['since'] = datetime.datetime.combine(start_date, datetime.time.min).timestamp()
+        filters['until'] = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min).timestamp()
+    
+    total = history.count(**filters)
+    summary = history.summary(**filters)
+    if summary:
+        st.markdown("**📈 Resumo por plataforma**")
+        st.dataframe(summary, use_container_width=True, hide_index=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        page_size = st.selectbox("Itens por página", [10, 25, 50, 100], index=1)
+    pages = max(1, -(-total // page_size))
+    with col2:
+        page = st.number_input(f"Página (de {pages})", min_value=1, max_value=pages, value=1, step=1)
+    st.caption(f"{total} resultados encontrados")
+    
+    rows = history.query(limit=page_size, offset=(page - 1) * page_size, **filters)
+    for row in rows:
+        row['created_at'] = datetime.datetime.fromtimestamp(row['created_at']).strftime('%Y-%m-%d %H:%M')
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        
+        entry_id = st.selectbox("🔍 Ver resultado completo", [row['id'] for row in rows])
+        st.json(history.get(entry_id))
+
 # Título e descrição
 st.title("🚀 Agente de Otimização de Posts")
 st.markdown("""
@@ -19,10 +108,12 @@ Este agente usa IA para otimizar suas descrições de posts e maximizar o engaja
 
 # Sidebar para configurações
 with st.sidebar:
+    page = st.radio("📄 Página", ["✨ Otimizar", "📚 Histórico"], horizontal=True)
+    
     st.header("⚙️ Configurações")
     
-    # Verificar se a API key está configurada
-    if not Config.GEMINI_API_KEY:
+    # Verificar se a API key está configurada (com SERVER_URL, quem chama o modelo é o servidor)
+    if not Config.SERVER_URL and Config.LLM_BACKEND != 'local' and not (Config.GEMINI_API_KEY or (Config.LLM_BACKEND == 'pool' and Config.GEMINI_API_KEYS)):
         st.error("⚠️ Chave da API do Gemini não encontrada!")
         st.info("""
         Para usar este agente:
@@ -43,23 +134,72 @@ with st.sidebar:
     
     # Configurações avançadas
     st.subheader("🔧 Configurações Avançadas")
+    if Config.SERVER_URL:
+        st.caption(f"🛰️ Pedidos enviados ao servidor {Config.SERVER_URL}, que usa a própria configuração do modelo")
+    
     temperature = st.slider(
         "🎲 Criatividade",
         min_value=0.1,
         max_value=1.0,
         value=Config.TEMPERATURE,
         step=0.1,
+        disabled=bool(Config.SERVER_URL),
         help="Valores mais altos geram conteúdo mais criativo"
     )
     
+    # Sem TOKEN_BUDGETS, o tamanho automático seria sempre MAX_TOKENS; só o slider é exibido
+    auto_budget = Config.TOKEN_BUDGETS and st.checkbox(
+        "🎯 Tamanho automático por plataforma",
+        value=True,
+        disabled=bool(Config.SERVER_URL),
+        help="Escolhe o limite de tokens pela plataforma e pelo tamanho da descrição"
+    )
+    
     max_tokens = st.slider(
         "📝 Tamanho máximo",
         min_value=100,
         max_value=2000,
         value=Config.MAX_TOKENS,
         step=100,
-        help="Número máximo de caracteres na resposta"
+        disabled=auto_budget or bool(Config.SERVER_URL),
+        help="Número máximo de tokens na resposta; valores menores geram respostas mais curtas e baratas"
+    )
+    if auto_budget:
+        max_tokens = None
+    
+    # Cache de respostas
+    use_cache = st.checkbox(
+        "🗄️ Usar cache de respostas",
+        value=True,
+        disabled=bool(Config.SERVER_URL),
+        help="Reaproveita respostas de prompts idênticos sem chamar a API"
+    )
+    
+    refresh_cache = st.checkbox(
+        "🔄 Forçar nova geração",
+        value=False,
+        disabled=not use_cache,
+        help="Ignora a resposta em cache e grava a nova geração"
+    )
+    
+    # O streaming não passa pelo hedging; com HEDGING, a exibição em tempo real fica desligada por padrão
+    live = st.checkbox(
+        "⚡ Exibir texto conforme é gerado",
+        value=not (Config.SERVER_URL or Config.HEDGING),
+        disabled=bool(Config.SERVER_URL),
+        help="Mostra a resposta do modelo em tempo real, sem esperar a geração terminar"
+             + (" (sem cópias hedged)" if Config.HEDGING else "")
     )
+    
+    if Config.HEDGING and not Config.SERVER_URL:
+        hedging = get_optimizer().backend.hedge_stats()
+        st.caption(f"🏁 Hedging (sem exibição em tempo real): {hedging['hedges']} cópias, "
+                   f"{hedging['hedges_won']} mais rápidas que a original, "
+                   f"{hedging['extra_prompt_tokens'] + hedging['extra_output_tokens']} tokens extras")
+
+if page == "📚 Histórico":
+    render_history(get_history())
+    st.stop()
 
 # Área principal
 col1, col2 = st.columns([1, 1])
@@ -86,19 +226,45 @@ with col1:
         if original_description.strip():
             with st.spinner("Otimizando seu post..."):
                 try:
-                    # Inicializar o agente
-                    optimizer = PostOptimizer()
-                    
-                    # Otimizar o post
-                    result = optimizer.optimize_post(
+                    optimizer = get_optimizer()
+                    request = dict(
                         original_description=original_description,
                         platform=platform,
-                        additional_context=additional_context
+                        additional_context=additional_context,
+                        refresh_cache=refresh_cache
+                    )
+                    if not Config.SERVER_URL:
+                        request.update(temperature=temperature, max_tokens=max_tokens, use_cache=use_cache)
+                    live_output = st.empty()
+                    
+                    def optimize_live():
+                        """Exibe o texto parcial enquanto o modelo gera a resposta"""
+                        text = ""
+                        for event in optimizer.optimize_post_stream(**request):
+                            if event['type'] == 'chunk':
+                                text += event['text']
+                                live_output.markdown(text + "▌")
+                            else:
+                                live_output.empty()
+                                return event['result']
+                    
+                    # Pedidos idênticos em andamento compartilham a mesma chamada ao modelo;
+                    # só quem iniciou a chamada vê o texto parcial
+                    request_key = (original_description, platform, additional_context,
+                                   temperature, max_tokens, use_cache, refresh_cache)
+                    result, shared = get_single_flight().do(
+                        request_key,
+                        optimize_live if live else lambda: optimizer.optimize_post(**request)
                     )
                     
                     if result['success']:
                         st.session_state['result'] = result
-                        st.success("✅ Post otimizado com sucesso!")
+                        if result.get('cached'):
+                            st.success("✅ Post otimizado com sucesso! (resposta do cache)")
+                        elif shared:
+                            st.success("✅ Post otimizado com sucesso! (pedido idêntico já em andamento)")
+                        else:
+                            st.success("✅ Post otimizado com sucesso!")
                     else:
                         st.error(f"❌ Erro: {result['error']}")
                         
@@ -162,6 +328,14 @@ with col2:
         with col_metrics3:
             st.metric("❓ Perguntas", metrics['question_count'])
         
+        usage = result.get('usage')
+        if usage:
+            st.caption(f"🔢 Tokens: {usage['prompt_tokens']} de entrada, {usage['output_tokens']} de saída "
+                       f"(limite {usage['max_output_tokens']})"
+                       + (f", {usage['continuations']} continuação(ões)" if usage.get('continuations') else ""))
+        if result.get('finish_reason') == 'MAX_TOKENS':
+            st.warning("✂️ O texto atingiu o limite de tamanho e pode estar incompleto. Aumente o tamanho máximo.")
+        
         # Sugestões
         if result['suggestions']:
             st.subheader("💡 Sugestões")
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Benchmarks do pipeline de otimização
+
+Grava respostas reais do modelo uma única vez em um cassete e as reproduz com
+as latências originais, medindo vazão, latência por post (p50/p95/p99), retries
+e pico de memória do batch, além do custo local de métricas, sugestões e da
+saída do CLI. Os resultados são gravados em JSON para comparar execuções.
+O subcomando startup mede o tempo de inicialização do CLI, e o subcomando
+ratelimit confere o limite de RPM compartilhado entre processos.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import platform as platform_info
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from backends import CassetteBackend, create_backend
+from cli import print_result
+from config import Config
+from post_optimizer import PostOptimizer
+from rate_limiter import FileRateLimiter, RateLimiter
+
+
+def load_templates(path: str) -> list:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def synthetic_posts(templates: list, count: int) -> list:
+    """Gera `count` posts a partir dos templates, variando a descrição após a primeira rodada"""
+    posts = []
+    for i in range(count):
+        template = templates[i % len(templates)]
+        post = dict(template)
+        round_number = i // len(templates)
+        if round_number:
+            post['description'] = f"{template['description']} (variação {round_number})"
+        posts.append(post)
+    return posts
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Percentil por interpolação linear"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_summary(latencies: list) -> dict:
+    return {
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'mean': statistics.fmean(latencies) if latencies else 0.0,
+        'max': max(latencies, default=0.0)
+    }
+
+
+def run_batch(optimizer: PostOptimizer, posts: list, concurrency: int, pack_size: int) -> dict:
+    """Executa um batch medindo a latência de cada post e o pico de memória"""
+    latencies = []
+    inside_pack = threading.local()
+    optimize_post = optimizer.optimize_post
+    optimize_packed = optimizer.optimize_packed
+
+    def timed_optimize_post(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return optimize_post(*args, **kwargs)
+        finally:
+            # Dentro de um pacote, a latência já é contada para o pacote inteiro
+            if not getattr(inside_pack, 'active', False):
+                latencies.append(time.perf_counter() - start)
+
+    def timed_optimize_packed(items, *args, **kwargs):
+        start = time.perf_counter()
+        inside_pack.active = True
+        try:
+            return optimize_packed(items, *args, **kwargs)
+        finally:
+            inside_pack.active = False
+            latencies.extend([time.perf_counter() - start] * len(items))
+
+    optimizer.optimize_post = timed_optimize_post
+    optimizer.optimize_packed = timed_optimize_packed
+    calls_before = optimizer.backend.calls
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        if concurrency > 1:
+            results = asyncio.run(optimizer.abatch_optimize(
+                posts, concurrency=concurrency, pack_size=pack_size
+            ))
+        else:
+            results = optimizer.batch_optimize(posts, pack_size=pack_size)
+        elapsed = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        del optimizer.optimize_post, optimizer.optimize_packed
+
+    backend_calls = optimizer.backend.calls - calls_before
+    counter = optimizer.instrumentation.counter
+    successes = sum(1 for result in results if result['success'])
+    requests_needed = len(posts) if pack_size <= 1 else -(-len(posts) // pack_size)
+
+    return {
+        'posts': len(posts),
+        'successes': successes,
+        'failures': len(results) - successes,
+        'elapsed_seconds': elapsed,
+        'throughput_posts_per_second': len(posts) / elapsed if elapsed else 0.0,
+        'latency_seconds': latency_summary(latencies),
+        'backend_calls': backend_calls,
+        'retries': max(0, backend_calls - requests_needed),
+        'prompt_tokens_per_post': counter('prompt_tokens_total') / len(posts) if posts else 0.0,
+        'output_tokens_per_post': counter('output_tokens_total') / len(posts) if posts else 0.0,
+        'peak_memory_bytes': peak_memory
+    }, results
+
+
+def run_local_processing(optimizer: PostOptimizer, results: list) -> dict:
+    """Mede o custo local (sem modelo) de métricas, sugestões e saída do CLI"""
+    successes = [result for result in results if result['success']]
+    if not successes:
+        return {}
+
+    def measure(function) -> float:
+        start = time.perf_counter()
+        function()
+        return (time.perf_counter() - start) / len(successes) * 1e6
+
+    def metrics():
+        for result in successes:
+            optimizer._calculate_metrics(result['original_description'], result['optimized_description'])
+
+    def suggestions():
+        for result in successes:
+            optimizer._generate_suggestions(result['optimized_description'], result['platform'])
+
+    def cli_output():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i, result in enumerate(results):
+                print_result(i, result)
+            json.dumps(results, ensure_ascii=False)
+
+    return {
+        'calculate_metrics_us_per_post': measure(metrics),
+        'generate_suggestions_us_per_post': measure(suggestions),
+        'cli_output_us_per_post': measure(cli_output)
+    }
+
+
+def command_record(args):
+    """Grava um cassete executando os templates uma vez contra o backend real"""
+    backend = CassetteBackend(args.cassette, mode='record', backend=create_backend(args.backend))
+    optimizer = PostOptimizer(
+        rate_limiter=RateLimiter(requests_per_minute=args.rpm),
+        use_cache=False,
+        backend=backend
+    )
+    posts = synthetic_posts(load_templates(args.templates), args.count)
+
+    print(f"🎙️ Gravando {len(posts)} posts em {args.cassette}...")
+    results = optimizer.batch_optimize(posts, pack_size=args.pack_size)
+    failures = sum(1 for result in results if not result['success'])
+    print(f"✅ {backend.calls} interações gravadas ({backend.errors} erros, {failures} posts com falha)")
+
+
+def command_run(args):
+    """Reproduz o cassete para cada tamanho de batch e grava o relatório"""
+    backend = CassetteBackend(args.cassette, mode='replay', time_scale=args.time_scale)
+    templates = load_templates(args.templates)
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform_info.platform(),
+        'config': {
+            'cassette': args.cassette,
+            'concurrency': args.concurrency,
+            'pack_size': args.pack_size,
+            'rpm': args.rpm,
+            'time_scale': args.time_scale
+        },
+        'runs': []
+    }
+
+    for size in args.sizes:
+        optimizer = PostOptimizer(
+            rate_limiter=RateLimiter(requests_per_minute=args.rpm),
+            use_cache=False,
+            backend=backend
+        )
+        posts = synthetic_posts(templates, size)
+
+        print(f"⏱️ Batch de {size} posts...")
+        batch, results = run_batch(optimizer, posts, args.concurrency, args.pack_size)
+        batch['local_processing'] = run_local_processing(optimizer, results)
+        report['runs'].append(batch)
+
+        latency = batch['latency_seconds']
+        print(f"   {batch['throughput_posts_per_second']:.2f} posts/s | "
+              f"p50 {latency['p50']:.3f}s p95 {latency['p95']:.3f}s p99 {latency['p99']:.3f}s | "
+              f"retries {batch['retries']} | pico {batch['peak_memory_bytes'] / 1024 / 1024:.1f} MiB")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Relatório salvo em: {args.output}")
+
+
+def command_compare(args):
+    """Compara dois relatórios, tamanho a tamanho"""
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = {run['posts']: run for run in json.load(f)['runs']}
+    with open(args.candidate, 'r', encoding='utf-8') as f:
+        candidate = {run['posts']: run for run in json.load(f)['runs']}
+
+    for size in sorted(set(baseline) & set(candidate)):
+        old, new = baseline[size], candidate[size]
+        throughput = new['throughput_posts_per_second'] / (old['throughput_posts_per_second'] or 1)
+        p95 = new['latency_seconds']['p95'] - old['latency_seconds']['p95']
+        memory = new['peak_memory_bytes'] / (old['peak_memory_bytes'] or 1)
+        # Relatórios antigos não têm a contagem de tokens
+        tokens = (new.get('prompt_tokens_per_post', 0) + new.get('output_tokens_per_post', 0)) \
+            - (old.get('prompt_tokens_per_post', 0) + old.get('output_tokens_per_post', 0))
+        print(f"{size:>7} posts | vazão x{throughput:.2f} | p95 {p95:+.3f}s | "
+              f"retries {old['retries']} → {new['retries']} | memória x{memory:.2f} | "
+              f"tokens/post {tokens:+.0f}")
+
+
+# Módulos que não devem ser carregados só para exibir a ajuda do CLI
+HEAVY_MODULES = ('google.generativeai', 'dotenv', 'asyncio', 'sqlite3', 'post_optimizer')
+
+
+def command_startup(args):
+    """Mede o tempo de inicialização de `cli.py --help` e falha se passar do limite"""
+    cli_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+    wall_times = []
+    heavy = set()
+
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', cli_path, '--help'],
+            capture_output=True, text=True
+        )
+        wall_times.append(time.perf_counter() - start)
+        if completed.returncode != 0:
+            print(f"❌ cli.py --help terminou com código {completed.returncode}")
+            sys.exit(1)
+
+        # Linhas do -X importtime: "import time: self [us] | cumulative | módulo"
+        for line in completed.stderr.splitlines():
+            module = line.rsplit('|', 1)[-1].strip()
+            if module in HEAVY_MODULES:
+                heavy.add(module)
+
+    wall_ms = statistics.median(wall_times) * 1000
+    print(f"⏱️ cli.py --help: mediana {wall_ms:.0f}ms em {args.runs} execuções "
+          f"(mín {min(wall_times) * 1000:.0f}ms, limite {args.max_ms:.0f}ms)")
+
+    failed = False
+    if heavy:
+        print(f"❌ Módulos pesados importados na inicialização: {', '.join(sorted(heavy))}")
+        failed = True
+    if wall_ms > args.max_ms:
+        print("❌ Inicialização acima do limite")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("✅ Inicialização dentro do orçamento")
+
+
+def _rate_limit_worker(path: str, rpm: int, window: float, count: int) -> list:
+    """Processo da verificação de ratelimit: faz `count` reservas e retorna os horários de envio"""
+    limiter = FileRateLimiter(path, requests_per_minute=rpm)
+    limiter.WINDOW = window
+    sent = []
+    for _ in range(count):
+        limiter.acquire()
+        sent.append(time.time())
+    return sent
+
+
+def command_ratelimit(args):
+    """Vários processos dividem um FileRateLimiter; falha se alguma janela passar do RPM"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'rate_limit.json')
+        with multiprocessing.Pool(args.processes) as pool:
+            sent = pool.starmap(
+                _rate_limit_worker, [(path, args.rpm, args.window, args.requests)] * args.processes
+            )
+    sent = sorted(moment for times in sent for moment in times)
+
+    # A janela medida desconta a folga, que cobre o atraso de acordar do sleep
+    span = args.window - args.tolerance
+    peak = max(sum(1 for other in sent[i:] if other < moment + span) for i, moment in enumerate(sent))
+    elapsed = sent[-1] - sent[0]
+    print(f"⏱️ {len(sent)} reservas em {args.processes} processos, {elapsed:.1f}s; "
+          f"pico de {peak} em uma janela de {args.window:g}s (limite {args.rpm})")
+    if peak > args.rpm:
+        print("❌ Limite de requisições excedido em uma janela deslizante")
+        sys.exit(1)
+    print("✅ Nenhuma janela acima do limite")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline de otimização de posts")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record = subparsers.add_parser('record', help='Grava um cassete com respostas reais')
+    record.add_argument('--cassette', required=True, help='Arquivo JSONL do cassete')
+    record.add_argument('--backend', choices=['gemini', 'pool', 'local'], default=Config.LLM_BACKEND)
+    record.add_argument('--templates', default='exemplo_posts.json', help='Posts usados como template')
+    record.add_argument('--count', type=int, default=5, help='Número de posts a gravar')
+    record.add_argument('--pack-size', type=int, default=1)
+    record.add_argument('--rpm', type=int, default=Config.REQUESTS_PER_MINUTE)
+    record.set_defaults(handler=command_record)
+
+    run = subparsers.add_parser('run', help='Reproduz um cassete e mede o pipeline')
+    run.add_argument('--cassette', required=True, help='Arquivo JSONL do cassete')
+    run.add_argument('--templates', default='exemplo_posts.json', help='Posts usados como template')
+    run.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')],
+                     default=[10, 100, 1000], help='Tamanhos de batch separados por vírgula')
+    run.add_argument('--concurrency', type=int, default=8)
+    run.add_argument('--pack-size', type=int, default=1)
+    run.add_argument('--rpm', type=int, default=0, help='Limite de requisições por minuto (0 desativa)')
+    run.add_argument('--time-scale', type=float, default=1.0,
+                     help='Fator aplicado às latências gravadas (0 não dorme)')
+    run.add_argument('-o', '--output', default='bench_results.json', help='Relatório JSON de saída')
+    run.set_defaults(handler=command_run)
+
+    compare = subparsers.add_parser('compare', help='Compara dois relatórios')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+    compare.set_defaults(handler=command_compare)
+
+    startup = subparsers.add_parser('startup', help='Mede o tempo de inicialização do CLI')
+    startup.add_argument('--runs', type=int, default=5, help='Número de execuções de cli.py --help')
+    startup.add_argument('--max-ms', type=float, default=300,
+                         help='Tempo máximo (mediana, em ms) antes de falhar')
+    startup.set_defaults(handler=command_startup)
+
+    ratelimit = subparsers.add_parser('ratelimit', help='Confere o RPM compartilhado entre processos')
+    ratelimit.add_argument('--processes', type=int, default=4, help='Processos dividindo o limitador')
+    ratelimit.add_argument('--requests', type=int, default=10, help='Reservas por processo')
+    ratelimit.add_argument('--rpm', type=int, default=10, help='Limite de requisições por janela')
+    ratelimit.add_argument('--window', type=float, default=60.0,
+                           help='Duração da janela em segundos (valores menores aceleram a verificação)')
+    ratelimit.add_argument('--tolerance', type=float, default=0.05,
+                           help='Folga, em segundos, para o atraso do sleep')
+    ratelimit.set_defaults(handler=command_ratelimit)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,190 @@ Interface de linha de comando para o Agente de Otimização de Posts
 import argparse
 import json
 import sys
-from post_optimizer import PostOptimizer
 from config import Config
 
+# Os demais módulos (e o SDK do Gemini) são importados só depois de validar os
+# argumentos, para que --help e erros de uso respondam rapidamente
+
+def print_result(i: int, result: dict, show_text: bool = True):
+    """Exibe o resultado de um post no terminal"""
+    if result['success']:
+        print(f"✅ Post {i+1} otimizado com sucesso!")
+        
+        # Exibir resultado (no modo --live o texto já foi exibido durante a geração)
+        if show_text:
+            print(f"\n📝 Original: {result['original_description']}")
+            print(f"✨ Otimizado: {result['optimized_description']}")
+        print(f"📱 Plataforma: {result['platform']}")
+        
+        if result.get('finish_reason') == 'MAX_TOKENS':
+            print("✂️ Texto truncado pelo limite de tokens, mesmo após a continuação")
+        
+        fast_path = result.get('fast_path')
+        if fast_path and fast_path['decision'] != 'model':
+            print(f"⚡ Atalho local ({fast_path['decision']}): post já atende às regras (score {fast_path['score']:.2f})")
+        
+        # Métricas
+        metrics = result['metrics']
+        print(f"📊 Métricas:")
+        print(f"   - Tamanho: {metrics['original_length']} → {metrics['optimized_length']} chars")
+        print(f"   - Hashtags: {metrics['hashtag_count']}")
+        print(f"   - Perguntas: {metrics['question_count']}")
+        print(f"   - Exclamações: {metrics['exclamation_count']}")
+        
+        # Sugestões
+        if result['suggestions']:
+            print(f"💡 Sugestões:")
+            for suggestion in result['suggestions']:
+                print(f"   - {suggestion}")
+        
+        print("-" * 50)
+        
+    else:
+        print(f"❌ Erro no post {i+1}: {result['error']}")
+
+def print_batch_summary(results: list):
+    """Exibe as métricas agregadas de um lote"""
+    from metrics import results_metrics, summarize
+    
+    summary = summarize(results_metrics(results))
+    successes = sum(1 for result in results if result['success'])
+    print(f"📊 Resumo do lote: {successes}/{len(results)} posts otimizados")
+    print(f"   - Tamanho médio: {summary['optimized_length']['mean']:.0f} chars")
+    print(f"   - Hashtags: {summary['hashtag_count']['total']} (média {summary['hashtag_count']['mean']:.1f})")
+    print(f"   - Emojis: {summary['emoji_count']['total']} (média {summary['emoji_count']['mean']:.1f})")
+    print(f"   - Perguntas: {summary['question_count']['total']}")
+    print(f"   - Exclamações: {summary['exclamation_count']['total']}")
+    
+    local = sum(1 for result in results if (result.get('fast_path') or {}).get('decision') in ('skip', 'template'))
+    if local:
+        print(f"   - Atalho local: {local} posts sem chamar o modelo")
+
+def print_cache_stats(optimizer):
+    """Exibe os acertos/falhas do cache de respostas"""
+    if optimizer.cache:
+        cache_stats = optimizer.cache.stats()
+        print(f"🗄️ Cache: {cache_stats['hits']} acertos, {cache_stats['misses']} falhas")
+
+def export_stats(optimizer, args):
+    """Exibe e/ou grava as métricas de execução conforme --stats e --metrics-file"""
+    if args.stats:
+        print("\n📈 Estatísticas:")
+        print(json.dumps(optimizer.stats(), indent=2))
+    
+    if args.metrics_file:
+        optimizer.instrumentation.write_prometheus(args.metrics_file)
+        print(f"📈 Métricas gravadas em: {args.metrics_file}")
+
+def run_live(optimizer, args) -> dict:
+    """Otimiza um post exibindo o texto conforme o modelo o gera"""
+    print(f"📝 Original: {args.description}")
+    print("✨ Otimizado: ", end='', flush=True)
+    for event in optimizer.optimize_post_stream(
+        original_description=args.description,
+        platform=args.platform,
+        additional_context=args.context,
+        refresh_cache=args.refresh_cache
+    ):
+        if event['type'] == 'chunk':
+            print(event['text'], end='', flush=True)
+        else:
+            print("\n")
+            return event['result']
+
+def run_stream(optimizer, args):
+    """Processa o arquivo em streaming, gravando cada resultado em JSONL assim que fica pronto"""
+    from streaming import Checkpoint, ResultWriter, iter_posts
+    
+    checkpoint = Checkpoint(args.output)
+    completed = checkpoint.load() if args.resume else set()
+    if completed:
+        print(f"⏩ Retomando: {len(completed)} resultados já concluídos serão ignorados")
+    
+    pending = checkpoint.pending(iter_posts(args.file))
+    
+    print(f"🔄 Processando posts em streaming ({args.concurrency} em paralelo)...")
+    processed = 0
+    with ResultWriter(args.output, append=args.resume) as writer:
+        for i, result in optimizer.iter_optimize(
+            pending, concurrency=args.concurrency, refresh_cache=args.refresh_cache
+        ):
+            print_result(i, result)
+            writer.write(i, result)
+            processed += 1
+    
+    print(f"💾 {processed} resultados gravados em: {args.output}")
+
+def create_optimizer(args):
+    """Otimizador local, com o backend, os limites e o cache escolhidos na linha de comando"""
+    from backends import create_backend
+    from post_optimizer import PostOptimizer
+    from rate_limiter import RateLimiter
+    
+    history = None
+    if not args.no_history:
+        from history_store import HistoryStore
+        
+        history = HistoryStore(Config.HISTORY_PATH)
+    
+    deduplicator = None
+    if args.dedup:
+        from dedup import Deduplicator
+        from streaming import iter_posts
+        
+        deduplicator = Deduplicator(threshold=args.dedup_threshold or Config.DEDUP_THRESHOLD)
+        if args.dedup_history:
+            for _, previous in iter_posts(args.dedup_history):
+                deduplicator.add_result(previous)
+    
+    return PostOptimizer(
+        rate_limiter=RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm),
+        use_cache=not args.no_cache,
+        backend=create_backend(args.backend),
+        deduplicator=deduplicator,
+        hedging=args.hedge,
+        fast_path=args.fast_path,
+        history=history
+    )
+
+def run_sharded(args):
+    """Divide o arquivo entre vários processos que compartilham o mesmo limite de RPM/TPM"""
+    from sharded_runner import ShardedRunner
+    
+    runner = ShardedRunner(
+        args.file,
+        args.output,
+        workdir=args.shard_dir,
+        shards=args.shards,
+        chunk_size=args.chunk_size,
+        resume=args.resume,
+        options={
+            'backend': args.backend,
+            'concurrency': args.concurrency,
+            'rpm': args.rpm,
+            'tpm': args.tpm,
+            'use_cache': not args.no_cache,
+            'refresh_cache': args.refresh_cache,
+            'hedging': args.hedge,
+            'fast_path': args.fast_path,
+            'history_path': None if args.no_history else Config.HISTORY_PATH
+        }
+    )
+    
+    print(f"🔄 Processando em {runner.shards} processos (blocos de {runner.chunk_size} posts, "
+          f"diretório {runner.workdir})...")
+    summary = runner.run()
+    
+    if summary['merged']:
+        print(f"\n📊 Resumo: {summary['successes']}/{summary['posts']} posts otimizados com sucesso "
+              f"em {summary['chunks']} blocos")
+        print(f"💾 Resultados gravados em: {args.output}")
+    elif summary['pending_chunks']:
+        print(f"\n⏳ {summary['pending_chunks']} blocos ainda em processamento em outros processos; "
+              f"o último a terminar grava {args.output}")
+    else:
+        print(f"\n⏳ Outro processo está gravando {args.output}")
+
 def main():
     parser = argparse.ArgumentParser(
         description="Agente de Otimização de Posts - Otimize suas descrições para maior engajamento",
@@ -17,7 +198,14 @@ def main():
 Exemplos de uso:
   python cli.py -d "Hoje vou falar sobre marketing digital" -p instagram
   python cli.py -d "A importância da liderança" -p linkedin -c "Público: executivos"
+  python cli.py -d "A importância da liderança" -p linkedin --live
   python cli.py -f posts.json
+  python cli.py -f posts.json --concurrency 8 --rpm 60
+  python cli.py -f posts.json --pack-size 5
+  python cli.py -f posts.json --dedup --dedup-history resultados_anteriores.json
+  python cli.py -f posts.jsonl -o resultados.jsonl --stream --resume
+  python cli.py -f posts.jsonl -o resultados.jsonl --shards 4 --rpm 60
+  python cli.py -f posts.jsonl -o resultados.jsonl --stream --server http://127.0.0.1:8000 --priority bulk
         """
     )
     
@@ -41,7 +229,7 @@ Exemplos de uso:
     
     parser.add_argument(
         '-f', '--file',
-        help='Arquivo JSON com múltiplos posts para otimizar'
+        help='Arquivo JSON (ou JSONL) com múltiplos posts para otimizar'
     )
     
     parser.add_argument(
@@ -49,6 +237,156 @@ Exemplos de uso:
         help='Arquivo de saída para salvar os resultados (padrão: stdout)'
     )
     
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Processa o arquivo post a post e grava cada resultado em JSONL (requer -f e -o)'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Com --stream ou --shards, retoma uma execução interrompida sem refazer posts já concluídos'
+    )
+    
+    parser.add_argument(
+        '--shards',
+        type=int,
+        help='Processa o arquivo em N processos com limite de RPM/TPM compartilhado (requer -f e -o)'
+    )
+    
+    parser.add_argument(
+        '--shard-dir',
+        help='Diretório de trabalho compartilhado dos shards (padrão: <saída>.shards)'
+    )
+    
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=500,
+        help='Com --shards, número de posts por bloco de trabalho (padrão: 500)'
+    )
+    
+    parser.add_argument(
+        '--live',
+        action='store_true',
+        help='Exibe o texto otimizado conforme o modelo o gera (apenas com -d)'
+    )
+    
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=1,
+        help='Número de requisições simultâneas no modo batch (padrão: 1, sequencial)'
+    )
+    
+    parser.add_argument(
+        '--pack-size',
+        type=int,
+        default=1,
+        help='Número de posts/plataformas por requisição no modo batch (padrão: 1, sem empacotamento)'
+    )
+    
+    parser.add_argument(
+        '--dedup',
+        action='store_true',
+        help='Agrupa posts quase idênticos do lote e chama o modelo uma vez por grupo'
+    )
+    
+    parser.add_argument(
+        '--dedup-threshold',
+        type=float,
+        help='Similaridade mínima (0-1) para considerar posts duplicados (padrão: DEDUP_THRESHOLD ou 0.8)'
+    )
+    
+    parser.add_argument(
+        '--dedup-history',
+        help='Resultados anteriores (JSON ou JSONL) reaproveitados pela deduplicação'
+    )
+    
+    parser.add_argument(
+        '--rpm',
+        type=int,
+        help='Limite de requisições por minuto, 0 desativa (padrão: GEMINI_RPM ou 10)'
+    )
+    
+    parser.add_argument(
+        '--tpm',
+        type=int,
+        help='Limite de tokens por minuto, 0 desativa (padrão: GEMINI_TPM ou 0)'
+    )
+    
+    parser.add_argument(
+        '--backend',
+        choices=['gemini', 'pool', 'local'],
+        help='Backend de geração; "pool" distribui entre GEMINI_API_KEYS/GEMINI_MODELS e "local" simula o modelo sem custo (padrão: LLM_BACKEND ou gemini)'
+    )
+    
+    parser.add_argument(
+        '--server',
+        help='Envia os posts a um server.py (ex.: http://127.0.0.1:8000) em vez de chamar o modelo, '
+             'dividindo a quota e a fila com os demais clientes (padrão: SERVER_URL)'
+    )
+    
+    parser.add_argument(
+        '--priority',
+        choices=['interactive', 'default', 'bulk'],
+        help='Classe de prioridade no servidor (padrão: bulk com -f, interactive com -d)'
+    )
+    
+    parser.add_argument(
+        '--tenant',
+        help='Tenant/projeto na partilha justa do servidor (padrão: o contexto do post)'
+    )
+    
+    parser.add_argument(
+        '--deadline',
+        type=float,
+        help='Prazo de cada post no servidor, em segundos (padrão: o tempo limite do servidor)'
+    )
+    
+    parser.add_argument(
+        '--fast-path',
+        choices=['off', 'skip', 'template'],
+        help='Posts que já atendem às regras da plataforma não vão ao modelo: '
+             'skip mantém o texto, template faz uma reescrita local (padrão: FAST_PATH)'
+    )
+    
+    parser.add_argument(
+        '--hedge',
+        action='store_true',
+        help='Envia uma cópia das requisições mais lentas que o percentil HEDGE_PERCENTILE (ver HEDGE_BUDGET)'
+    )
+    
+    parser.add_argument(
+        '--no-history',
+        action='store_true',
+        help='Não grava os resultados no histórico (HISTORY_PATH)'
+    )
+    
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Não lê nem grava respostas no cache em disco'
+    )
+    
+    parser.add_argument(
+        '--refresh-cache',
+        action='store_true',
+        help='Ignora respostas em cache e grava as novas gerações'
+    )
+    
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help='Exibe um resumo JSON da instrumentação (latências, retries, tokens, cache)'
+    )
+    
+    parser.add_argument(
+        '--metrics-file',
+        help='Grava as métricas de execução no formato texto do Prometheus'
+    )
+    
     parser.add_argument(
         '--pretty',
         action='store_true',
@@ -57,70 +395,140 @@ Exemplos de uso:
     
     args = parser.parse_args()
     
-    # Verificar se a API key está configurada
-    if not Config.GEMINI_API_KEY:
+    if args.stream and not (args.file and args.output):
+        parser.error("--stream requer um arquivo de entrada (-f) e de saída (-o)")
+    
+    if args.stream and args.pack_size > 1:
+        parser.error("--pack-size não é suportado com --stream")
+    
+    if args.shards is not None:
+        if args.shards < 1 or args.chunk_size < 1:
+            parser.error("--shards e --chunk-size devem ser maiores que zero")
+        if not (args.file and args.output):
+            parser.error("--shards requer um arquivo de entrada (-f) e de saída (-o)")
+        if args.stream or args.pack_size > 1 or args.dedup:
+            parser.error("--shards não pode ser combinado com --stream, --pack-size ou --dedup")
+    elif args.shard_dir:
+        parser.error("--shard-dir requer --shards")
+    
+    if args.resume and not (args.stream or args.shards):
+        parser.error("--resume só pode ser usado com --stream ou --shards")
+    
+    if (args.dedup_threshold is not None or args.dedup_history) and not args.dedup:
+        parser.error("--dedup-threshold e --dedup-history requerem --dedup")
+    
+    if args.dedup and (args.stream or not args.file):
+        parser.error("--dedup só pode ser usado no modo batch (-f, sem --stream)")
+    
+    if args.live and (args.file or not args.description):
+        parser.error("--live só pode ser usado com uma descrição (-d)")
+    
+    args.server = args.server or Config.SERVER_URL
+    if args.server:
+        if args.shards or args.pack_size > 1 or args.dedup or args.live:
+            parser.error("--server não pode ser combinado com --shards, --pack-size, --dedup ou --live")
+    elif args.priority or args.tenant or args.deadline is not None:
+        parser.error("--priority, --tenant e --deadline requerem --server")
+    
+    if not (args.file or args.description):
+        print("❌ Erro: Forneça uma descrição (-d) ou arquivo (-f)")
+        parser.print_help()
+        sys.exit(1)
+    
+    # Valores padrão vindos do ambiente/.env, resolvidos só agora
+    args.backend = args.backend or Config.LLM_BACKEND
+    args.rpm = Config.REQUESTS_PER_MINUTE if args.rpm is None else args.rpm
+    args.tpm = Config.TOKENS_PER_MINUTE if args.tpm is None else args.tpm
+    args.hedge = args.hedge or Config.HEDGING
+    args.no_history = args.no_history or not Config.HISTORY
+    
+    # Verificar se a API key está configurada (no modo --server, quem chama o modelo é o servidor)
+    if not args.server and args.backend != 'local' and not (Config.GEMINI_API_KEY or (args.backend == 'pool' and Config.GEMINI_API_KEYS)):
         print("❌ Erro: Chave da API do Gemini não encontrada!")
-        print("Configure GEMINI_API_KEY no arquivo .env")
+        print("Configure GEMINI_API_KEY (ou GEMINI_API_KEYS, para o pool) no arquivo .env")
         print("Obtenha sua chave gratuita em: https://makersuite.google.com/app/apikey")
         sys.exit(1)
     
     try:
-        optimizer = PostOptimizer()
+        if args.shards:
+            # Cada processo cria o próprio otimizador
+            run_sharded(args)
+            return
+        
+        if args.server:
+            from server_client import ServerClient
+            
+            optimizer = ServerClient(
+                args.server,
+                priority=args.priority or ('bulk' if args.file else 'interactive'),
+                tenant=args.tenant,
+                deadline=args.deadline
+            )
+        else:
+            optimizer = create_optimizer(args)
+        
+        if args.file and args.stream:
+            # Modo streaming - processar o arquivo post a post
+            run_stream(optimizer, args)
+            print_cache_stats(optimizer)
+            export_stats(optimizer, args)
+            return
         
         if args.file:
             # Modo batch - processar arquivo
-            with open(args.file, 'r', encoding='utf-8') as f:
-                posts = json.load(f)
+            from streaming import iter_posts
             
-            print(f"🔄 Processando {len(posts)} posts...")
-            results = optimizer.batch_optimize(posts)
+            posts = [post for _, post in iter_posts(args.file)]
             
-        elif args.description:
+            if args.server:
+                print(f"🔄 Enviando {len(posts)} posts ao servidor ({args.concurrency} em paralelo)...")
+                results = optimizer.batch_optimize(
+                    posts, concurrency=args.concurrency, refresh_cache=args.refresh_cache
+                )
+            elif args.concurrency > 1:
+                import asyncio
+                
+                print(f"🔄 Processando {len(posts)} posts ({args.concurrency} em paralelo)...")
+                results = asyncio.run(optimizer.abatch_optimize(
+                    posts, concurrency=args.concurrency, refresh_cache=args.refresh_cache,
+                    pack_size=args.pack_size
+                ))
+            else:
+                print(f"🔄 Processando {len(posts)} posts...")
+                results = optimizer.batch_optimize(
+                    posts, refresh_cache=args.refresh_cache, pack_size=args.pack_size
+                )
+            
+        else:
             # Modo single post
             print("🔄 Otimizando post...")
-            result = optimizer.optimize_post(
-                original_description=args.description,
-                platform=args.platform,
-                additional_context=args.context
-            )
+            if args.live:
+                result = run_live(optimizer, args)
+            else:
+                result = optimizer.optimize_post(
+                    original_description=args.description,
+                    platform=args.platform,
+                    additional_context=args.context,
+                    refresh_cache=args.refresh_cache
+                )
             results = [result]
-            
-        else:
-            print("❌ Erro: Forneça uma descrição (-d) ou arquivo (-f)")
-            parser.print_help()
-            sys.exit(1)
         
         # Processar resultados
         output_data = []
         for i, result in enumerate(results):
-            if result['success']:
-                print(f"✅ Post {i+1} otimizado com sucesso!")
-                
-                # Exibir resultado
-                print(f"\n📝 Original: {result['original_description']}")
-                print(f"✨ Otimizado: {result['optimized_description']}")
-                print(f"📱 Plataforma: {result['platform']}")
-                
-                # Métricas
-                metrics = result['metrics']
-                print(f"📊 Métricas:")
-                print(f"   - Tamanho: {metrics['original_length']} → {metrics['optimized_length']} chars")
-                print(f"   - Hashtags: {metrics['hashtag_count']}")
-                print(f"   - Perguntas: {metrics['question_count']}")
-                print(f"   - Exclamações: {metrics['exclamation_count']}")
-                
-                # Sugestões
-                if result['suggestions']:
-                    print(f"💡 Sugestões:")
-                    for suggestion in result['suggestions']:
-                        print(f"   - {suggestion}")
-                
-                output_data.append(result)
-                print("-" * 50)
-                
-            else:
-                print(f"❌ Erro no post {i+1}: {result['error']}")
-                output_data.append(result)
+            print_result(i, result, show_text=not args.live)
+            output_data.append(result)
+        
+        if len(results) > 1:
+            print_batch_summary(results)
+        
+        if optimizer.deduplicator:
+            report = optimizer.deduplicator.report()
+            print(f"🧬 Deduplicação: {report['clusters']} grupos para {report['items']} posts, "
+                  f"{report['calls_saved']} chamadas à API economizadas")
+        
+        print_cache_stats(optimizer)
+        export_stats(optimizer, args)
         
         # Salvar resultado
         if args.output:
@@ -1,20 +1,160 @@
 import os
-from dotenv import load_dotenv
 
-# Carrega variáveis de ambiente do arquivo .env
-load_dotenv()
+_env_loaded = False
+
+def _load_env():
+    """Carrega o arquivo .env uma única vez, na primeira configuração lida"""
+    global _env_loaded
+    if not _env_loaded:
+        _env_loaded = True
+        from dotenv import load_dotenv
+        load_dotenv()
+
+class _Env:
+    """
+    Configuração lida de uma variável de ambiente apenas no primeiro acesso
+    
+    Importar o módulo não lê o .env nem o ambiente; após o primeiro acesso,
+    o valor convertido substitui o descritor na classe.
+    """
+    
+    def __init__(self, name: str, default: str = None, cast=str):
+        self.name = name
+        self.default = default
+        self.cast = cast
+    
+    def __set_name__(self, owner, attr):
+        self.attr = attr
+    
+    def __get__(self, instance, owner):
+        _load_env()
+        value = os.getenv(self.name, self.default)
+        if value is not None:
+            value = self.cast(value)
+        setattr(owner, self.attr, value)
+        return value
 
 class Config:
     """Configurações do agente de otimização de posts"""
     
     # API do Gemini
-    GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-    GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash') 
+    GEMINI_API_KEY = _Env('GEMINI_API_KEY')
+    GEMINI_MODEL = _Env('GEMINI_MODEL', 'gemini-2.5-flash') 
+    
+    # Backend de geração: 'gemini' (API real), 'pool' (entre GEMINI_API_KEYS/GEMINI_MODELS) ou 'local' (simulado, sem custo)
+    LLM_BACKEND = _Env('LLM_BACKEND', 'gemini')
+    LOCAL_LATENCY = _Env('LOCAL_LATENCY', 'lognormal')
+    LOCAL_LATENCY_MEDIAN = _Env('LOCAL_LATENCY_MEDIAN', '1.0', float)
+    LOCAL_REQUESTS_PER_MINUTE = _Env('LOCAL_RPM', '0', int)
+    LOCAL_REQUESTS_PER_DAY = _Env('LOCAL_RPD', '0', int)
     
     # Configurações do agente
     MAX_TOKENS = 1000
     TEMPERATURE = 0.7
     
+    # Limites de quota (0 desativa o limite)
+    REQUESTS_PER_MINUTE = _Env('GEMINI_RPM', '10', int)
+    TOKENS_PER_MINUTE = _Env('GEMINI_TPM', '0', int)
+    CONCURRENCY = _Env('GEMINI_CONCURRENCY', '4', int)
+    
+    # Retry em erros de quota (429)
+    RETRY_MAX_ATTEMPTS = _Env('RETRY_MAX_ATTEMPTS', '3', int)
+    RETRY_BASE_DELAY = _Env('RETRY_BASE_DELAY', '6', float)  # 10 req/min = 1 req a cada 6 segundos
+    DAILY_QUOTA_POLICY = _Env('DAILY_QUOTA_POLICY', 'fail')  # 'fail' ou 'wait'
+    
+    # Cache de respostas em disco
+    CACHE_PATH = _Env('CACHE_PATH', 'responses_cache.sqlite')
+    CACHE_MAX_ENTRIES = _Env('CACHE_MAX_ENTRIES', '10000', int)
+    CACHE_TTL = _Env('CACHE_TTL', str(7 * 24 * 3600), int)  # segundos, 0 desativa a expiração
+    
+    # Histórico de resultados (SQLite), gravado pelo cli.py e pela interface web
+    HISTORY = _Env('HISTORY', '1', lambda value: value.lower() not in ('0', 'false', 'no'))
+    HISTORY_PATH = _Env('HISTORY_PATH', 'history.sqlite')
+    
+    # Modo empacotado: limite de tokens de saída de uma requisição com vários itens
+    PACKED_MAX_TOKENS = _Env('PACKED_MAX_TOKENS', '8192', int)
+    
+    # Orçamento de tokens de saída por plataforma: (mínimo, máximo), limitado por MAX_TOKENS.
+    # Desativado por padrão: modelos com raciocínio (como o gemini-2.5-flash) gastam parte do limite pensando
+    TOKEN_BUDGETS = _Env('TOKEN_BUDGETS', '0', lambda value: value.lower() not in ('0', 'false', 'no'))
+    OUTPUT_TOKEN_BUDGETS = {
+        'twitter': (120, 250),
+        'instagram': (300, 700),
+        'linkedin': (400, 1000)
+    }
+    
+    # Respostas interrompidas: continuações após MAX_TOKENS e nova tentativa após bloqueio
+    MAX_CONTINUATIONS = _Env('MAX_CONTINUATIONS', '1', int)  # 0 desativa
+    CONTINUATION_PROMPT = """
+    Sua resposta ao pedido acima foi interrompida pelo limite de tamanho.
+    Continue exatamente do ponto em que ela parou, sem repetir o que já foi escrito
+    e sem nenhum comentário adicional.
+    """
+    BLOCKED_RETRY_TEMPERATURE = _Env('BLOCKED_RETRY_TEMPERATURE', '0.3', float)
+    BLOCKED_RETRY_NOTE = "Mantenha o texto adequado a todos os públicos e totalmente original, sem reproduzir trechos de terceiros."
+    
+    # Cache de contexto: blocos estáticos de PROMPTS enviados uma vez e referenciados por identificador
+    CONTEXT_CACHE = _Env('CONTEXT_CACHE', '0', lambda value: value.lower() not in ('0', 'false', 'no'))
+    CONTEXT_CACHE_TTL = _Env('CONTEXT_CACHE_TTL', '3600', int)  # segundos
+    CONTEXT_CACHE_MIN_TOKENS = _Env('CONTEXT_CACHE_MIN_TOKENS', '1024', int)  # mínimo aceito pela API do Gemini
+    
+    # Pool de chaves/modelos (backend 'pool'): listas separadas por vírgula, modelos em ordem de preferência
+    GEMINI_API_KEYS = _Env('GEMINI_API_KEYS')
+    GEMINI_MODELS = _Env('GEMINI_MODELS')
+    POOL_LATENCY_SLO = _Env('POOL_LATENCY_SLO', '0', float)  # segundos, 0 desativa
+    POOL_RPM = _Env('POOL_RPM', '0', int)  # por par chave/modelo, 0 desativa
+    
+    # Requisições hedged: cópia de uma requisição lenta (apenas no modo interativo e no servidor)
+    HEDGING = _Env('HEDGING', '0', lambda value: value.lower() not in ('0', 'false', 'no'))
+    HEDGE_PERCENTILE = _Env('HEDGE_PERCENTILE', '0.9', float)  # percentil da latência que dispara a cópia
+    HEDGE_BUDGET = _Env('HEDGE_BUDGET', '0.1', float)  # fração máxima de requisições extras
+    HEDGE_MIN_SAMPLES = _Env('HEDGE_MIN_SAMPLES', '20', int)  # latências observadas antes da primeira cópia
+    
+    # Deduplicação de posts quase idênticos (similaridade de Jaccard mínima)
+    DEDUP_THRESHOLD = _Env('DEDUP_THRESHOLD', '0.8', float)
+    
+    # Regras de cada plataforma: métrica de metrics.text_metrics com 'min' e/ou 'max',
+    # peso no score e sugestão exibida quando a regra não é atendida
+    PLATFORM_RULES = {
+        'instagram': [
+            {'metric': 'hashtag_count', 'min': 3, 'suggestion': "Considere adicionar mais hashtags relevantes"},
+            {'metric': 'question_count', 'min': 1, 'suggestion': "Adicione uma pergunta para gerar mais comentários"},
+            {'metric': 'exclamation_count', 'min': 1, 'suggestion': "Use exclamações para criar mais entusiasmo"}
+        ],
+        'linkedin': [
+            {'metric': 'length', 'min': 100, 'suggestion': "Posts mais longos tendem a ter melhor engajamento no LinkedIn"},
+            {'metric': 'question_count', 'min': 1, 'suggestion': "Termine com uma pergunta para gerar discussão"}
+        ],
+        'twitter': [
+            {'metric': 'length', 'max': 200, 'suggestion': "Considere dividir em threads para posts mais longos"},
+            {'metric': 'hashtag_count', 'min': 2, 'suggestion': "Adicione hashtags relevantes para aumentar a visibilidade"}
+        ]
+    }
+    RULES_PATH = _Env('RULES_PATH')  # JSON com regras extras ou que substituem as de uma plataforma
+    
+    # Atalho local: posts com score de regras >= FAST_PATH_THRESHOLD não vão ao modelo
+    FAST_PATH = _Env('FAST_PATH', 'off')  # 'off', 'skip' (mantém o texto) ou 'template' (reescrita local)
+    FAST_PATH_THRESHOLD = _Env('FAST_PATH_THRESHOLD', '1.0', float)
+    FAST_PATH_TEMPLATES = {
+        'instagram': "{body}\n\n{hashtags}",
+        'linkedin': "{body}\n\n{hashtags}",
+        'twitter': "{body} {hashtags}"
+    }
+    
+    # Modo servidor (server.py)
+    SERVER_HOST = _Env('SERVER_HOST', '127.0.0.1')
+    SERVER_PORT = _Env('SERVER_PORT', '8000', int)
+    SERVER_QUEUE_SIZE = _Env('SERVER_QUEUE_SIZE', '100', int)
+    SERVER_BATCH_SIZE = _Env('SERVER_BATCH_SIZE', '8', int)
+    SERVER_BATCH_WINDOW = _Env('SERVER_BATCH_WINDOW', '0.05', float)  # segundos
+    SERVER_URL = _Env('SERVER_URL')  # cli.py e interface web enviam os pedidos a este servidor, se definido
+    
+    # Agendador do servidor: classes 'interactive', 'default' e 'bulk', prazos e partilha justa entre tenants
+    SCHEDULER_DEFAULT_PRIORITY = _Env('SCHEDULER_DEFAULT_PRIORITY', 'interactive')
+    SCHEDULER_DEADLINE_POLICY = _Env('SCHEDULER_DEADLINE_POLICY', 'drop')  # 'drop' ou 'downgrade'
+    SCHEDULER_INTERACTIVE_WORKERS = _Env('SCHEDULER_INTERACTIVE_WORKERS', '1', int)  # workers reservados
+    TENANT_WEIGHTS = _Env('TENANT_WEIGHTS')  # 'projeto:peso' separados por vírgula
+    
     # Prompts para diferentes tipos de conteúdo
     PROMPTS = {
         'instagram': """
@@ -64,4 +204,21 @@ class Config:
         
         Forneça uma versão otimizada que mantenha a essência da mensagem original mas maximize o engajamento.
         """
-    } 
\ No newline at end of file
+    }
+    
+    # Prompt do modo empacotado: vários posts e/ou plataformas em uma única requisição
+    PACKED_PROMPT = """
+        Você é um especialista em marketing digital e criação de conteúdo para redes sociais.
+        Sua tarefa é otimizar várias descrições de posts de uma só vez para maximizar o engajamento.
+        
+        Siga as diretrizes da plataforma indicada em cada item:
+        
+        {platform_guidelines}
+        
+        Itens a otimizar (JSON):
+        {items}
+        
+        Para cada item, forneça uma versão otimizada que mantenha a essência da mensagem original mas maximize o engajamento, considerando o contexto adicional quando houver.
+        Responda APENAS com um array JSON, sem nenhum texto fora dele, no formato:
+        [{{"id": 0, "optimized_description": "descrição otimizada"}}]
+        """
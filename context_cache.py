@@ -0,0 +1,211 @@
+import hashlib
+import logging
+import threading
+import time
+
+from backends import estimate_tokens
+from config import Config
+from prompt_compiler import compiled_prompt
+
+logger = logging.getLogger(__name__)
+
+# Espera antes de tentar de novo criar o cache de um prefixo que falhou
+DEFAULT_RETRY_AFTER = 600
+
+
+def static_prefix(platform: str) -> str:
+    """
+    Bloco estático de instruções de uma plataforma, como aparece no início do prompt
+
+    É o template compilado até a linha que recebe a descrição original; o
+    restante do prompt (descrição, contexto adicional) muda a cada post.
+    """
+    template = compiled_prompt(platform)
+    position = template.find('{original_description}')
+    if position < 0:
+        return ''
+    prefix = template[:template.rfind('\n', 0, position) + 1]
+    # O prompt é montado com str.format, que desfaz as chaves escapadas
+    return prefix.replace('{{', '{').replace('}}', '}')
+
+
+class ContextCache:
+    """
+    Cache de contexto no servidor para os blocos estáticos de Config.PROMPTS
+
+    O bloco de instruções de cada plataforma é enviado uma única vez ao
+    backend (`client`), que devolve um identificador; os prompts que começam
+    por esse bloco passam a enviar só o restante, junto com o identificador. O
+    TTL é renovado quando está perto de expirar, e os identificadores são
+    descartados quando Config.PROMPTS muda. Se o backend não conseguir criar o
+    cache (SDK antigo, modelo sem suporte, prefixo abaixo do mínimo da API),
+    o prompt segue inteiro, como antes.
+
+    O `client` implementa create_cached_content(prefix, ttl) -> identificador,
+    refresh_cached_content(identificador, ttl) e delete_cached_content(identificador).
+    """
+
+    def __init__(self, client, ttl: float = 3600, refresh_margin: float = None,
+                 min_tokens: int = 0, retry_after: float = DEFAULT_RETRY_AFTER):
+        """
+        Args:
+            client: Backend que cria, renova e remove o conteúdo em cache
+            ttl: Validade, em segundos, de cada conteúdo em cache
+            refresh_margin: Renova o TTL quando faltar menos que isso (padrão: 10% do TTL)
+            min_tokens: Prefixos menores que isso não são enviados (mínimo exigido pela API)
+            retry_after: Segundos até tentar de novo um prefixo cuja criação falhou
+        """
+        self.client = client
+        self.ttl = ttl
+        self.refresh_margin = ttl * 0.1 if refresh_margin is None else refresh_margin
+        self.min_tokens = min_tokens
+        self.retry_after = retry_after
+
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._prefixes = []
+        self._entries = {}
+        self._failed_until = {}
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'created': 0,
+            'refreshed': 0,
+            'invalidated': 0,
+            'failures': 0,
+            'cached_tokens': 0
+        }
+
+    def resolve(self, prompt: str):
+        """
+        Separa o prefixo em cache do restante do prompt
+
+        Returns:
+            tuple: (identificador, restante) quando o prompt começa por um bloco
+                em cache, ou (None, prompt) para usar o prompt inteiro
+        """
+        prefix = self._match(prompt)
+        if prefix is None:
+            return None, prompt
+
+        handle = self._handle(prefix)
+        with self._lock:
+            if handle is None:
+                self.stats['misses'] += 1
+                return None, prompt
+            self.stats['hits'] += 1
+            self.stats['cached_tokens'] += estimate_tokens(prefix)
+        return handle, prompt[len(prefix):]
+
+    def _match(self, prompt: str):
+        """Prefixo estático pelo qual o prompt começa, ou None"""
+        with self._lock:
+            # hash(tuple) de strings é barato: o hash de cada string fica guardado nela
+            fingerprint = hash(tuple(sorted(Config.PROMPTS.items())))
+            if fingerprint != self._fingerprint:
+                stale = self._rebuild(fingerprint)
+            else:
+                stale = []
+            prefixes = self._prefixes
+
+        for handle in stale:
+            self._delete(handle)
+        for prefix in prefixes:
+            if prompt.startswith(prefix):
+                return prefix
+        return None
+
+    def _rebuild(self, fingerprint) -> list:
+        """Recalcula os prefixos após uma mudança em Config.PROMPTS (chamado com o lock)"""
+        prefixes = {static_prefix(platform) for platform in Config.PROMPTS}
+        self._prefixes = sorted(
+            (prefix for prefix in prefixes if prefix and estimate_tokens(prefix) >= self.min_tokens),
+            key=len, reverse=True
+        )
+        self._fingerprint = fingerprint
+
+        keys = {self._key(prefix) for prefix in self._prefixes}
+        stale = [key for key in self._entries if key not in keys]
+        handles = [self._entries.pop(key)['handle'] for key in stale]
+        if handles:
+            self.stats['invalidated'] += len(handles)
+            logger.info(f"Config.PROMPTS mudou; {len(handles)} conteúdos em cache descartados")
+        return handles
+
+    @staticmethod
+    def _key(prefix: str) -> str:
+        return hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+
+    def _handle(self, prefix: str):
+        """Identificador válido do prefixo, criando ou renovando o conteúdo em cache se preciso"""
+        key = self._key(prefix)
+        with self._lock:
+            now = time.monotonic()
+            if self._failed_until.get(key, 0) > now:
+                return None
+
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires_at'] - now > self.refresh_margin:
+                return entry['handle']
+
+            # Uma thread por vez cria ou renova; as outras usam o prompt inteiro enquanto isso
+            if entry is not None and entry['busy']:
+                return entry['handle'] if entry['expires_at'] > now else None
+            if entry is None:
+                entry = self._entries[key] = {'handle': None, 'expires_at': 0.0, 'busy': True}
+            entry['busy'] = True
+
+        handle = entry['handle']
+        try:
+            if handle is not None and entry['expires_at'] > time.monotonic():
+                self.client.refresh_cached_content(handle, self.ttl)
+                counter = 'refreshed'
+            else:
+                handle = self.client.create_cached_content(prefix, self.ttl)
+                counter = 'created'
+        except Exception as e:
+            logger.warning(f"Cache de contexto indisponível, usando o prompt completo: {str(e)}")
+            with self._lock:
+                self.stats['failures'] += 1
+                self._failed_until[key] = time.monotonic() + self.retry_after
+                self._entries.pop(key, None)
+            return None
+
+        with self._lock:
+            self.stats[counter] += 1
+            entry.update(handle=handle, expires_at=time.monotonic() + self.ttl, busy=False)
+        return handle
+
+    def discard(self, handle):
+        """Esquece um identificador que o backend recusou (por exemplo, expirado no servidor)"""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry['handle'] == handle:
+                    del self._entries[key]
+                    self.stats['invalidated'] += 1
+
+    def invalidate(self):
+        """Remove todos os conteúdos em cache do servidor"""
+        with self._lock:
+            handles = [entry['handle'] for entry in self._entries.values() if entry['handle'] is not None]
+            self.stats['invalidated'] += len(handles)
+            self._entries.clear()
+            self._fingerprint = None
+        for handle in handles:
+            self._delete(handle)
+
+    def _delete(self, handle):
+        try:
+            self.client.delete_cached_content(handle)
+        except Exception as e:
+            # O conteúdo expira sozinho pelo TTL
+            logger.debug(f"Erro ao remover conteúdo em cache: {str(e)}")
+
+    def cache_stats(self) -> dict:
+        """Acertos, criações, renovações e tokens de prompt servidos pelo cache"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = sum(1 for entry in self._entries.values() if entry['handle'] is not None)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
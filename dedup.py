@@ -0,0 +1,297 @@
+import random
+import re
+import threading
+import unicodedata
+import zlib
+
+# Primo de Mersenne usado nas permutações universais do MinHash
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_DATE_PATTERN = re.compile(r"\d{1,4}[/.-]\d{1,2}(?:[/.-]\d{1,4})?")
+_TIME_PATTERN = re.compile(r"\b\d{1,2}(?::\d{2}(?::\d{2})?|h\d{0,2})\b")
+_NUMBER_PATTERN = re.compile(r"\d+")
+_PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+_SPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """
+    Normaliza um texto para comparação
+
+    Remove acentos, caixa, pontuação e espaços repetidos, e troca datas e
+    horários por um marcador, para que descrições que só diferem nesses pontos
+    fiquem idênticas. Os demais números (preços, percentuais, quantidades) são
+    mantidos.
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = _DATE_PATTERN.sub(' 0 ', text)
+    text = _TIME_PATTERN.sub(' 0 ', text)
+    text = _PUNCTUATION_PATTERN.sub(' ', text)
+    return _SPACE_PATTERN.sub(' ', text).strip()
+
+
+def numbers(text: str) -> tuple:
+    """
+    Números do texto fora de datas e horários, em ordem (ex.: '10% e 3x' -> ('10', '3'))
+
+    Dois posts só são comparados se tiverem os mesmos números: um texto
+    escrito para "10% de desconto" não pode ser reaproveitado para "50%".
+    """
+    text = _TIME_PATTERN.sub(' ', _DATE_PATTERN.sub(' ', text.lower()))
+    return tuple(sorted(str(int(number)) for number in _NUMBER_PATTERN.findall(text)))
+
+
+def shingles(text: str, size: int = 5) -> set:
+    """Conjunto de hashes dos k-gramas de caracteres do texto normalizado"""
+    if len(text) <= size:
+        return {zlib.crc32(text.encode('utf-8'))}
+    return {zlib.crc32(text[i:i + size].encode('utf-8')) for i in range(len(text) - size + 1)}
+
+
+class MinHashIndex:
+    """
+    Índice LSH de assinaturas MinHash
+
+    Cada assinatura é dividida em `bands` faixas; dois textos viram candidatos
+    quando coincidem em ao menos uma faixa, e a similaridade de Jaccard é então
+    estimada pela fração de posições iguais nas assinaturas.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm deve ser múltiplo de bands")
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)
+        ]
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+
+    def signature(self, shingle_set: set) -> tuple:
+        return tuple(
+            min(((a * value + b) % _PRIME) & _MAX_HASH for value in shingle_set)
+            for a, b in self._permutations
+        )
+
+    def _bands(self, signature: tuple):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def add(self, key, signature: tuple):
+        self._signatures[key] = signature
+        for band, value in self._bands(signature):
+            self._buckets[band].setdefault(value, []).append(key)
+
+    def remove(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, value in self._bands(signature):
+            bucket = self._buckets[band].get(value, [])
+            if key in bucket:
+                bucket.remove(key)
+
+    def query(self, signature: tuple, threshold: float):
+        """
+        Retorna (chave, similaridade) do vizinho mais similar acima do limiar, ou (None, 0.0)
+        """
+        candidates = set()
+        for band, value in self._bands(signature):
+            candidates.update(self._buckets[band].get(value, ()))
+
+        best_key, best_similarity = None, 0.0
+        for key in candidates:
+            other = self._signatures[key]
+            similarity = sum(1 for x, y in zip(signature, other) if x == y) / self.num_perm
+            if similarity >= threshold and similarity > best_similarity:
+                best_key, best_similarity = key, similarity
+        return best_key, best_similarity
+
+    def __len__(self):
+        return len(self._signatures)
+
+
+class Deduplicator:
+    """
+    Agrupa posts quase idênticos para chamar o modelo uma única vez por grupo
+
+    Só são comparados itens com a mesma plataforma, o mesmo contexto e os
+    mesmos números fora de datas e horários (ver numbers). Os resultados bem-sucedidos ficam no índice e são reaproveitados por lotes
+    seguintes (ou carregados de execuções anteriores com add_result).
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 5):
+        """
+        Args:
+            threshold: Similaridade de Jaccard mínima para considerar dois textos duplicados
+            num_perm: Tamanho da assinatura MinHash
+            bands: Número de faixas do LSH (num_perm deve ser múltiplo)
+            shingle_size: Tamanho dos k-gramas de caracteres
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError(f"Limiar de similaridade inválido: {threshold}. Use um valor em (0, 1]")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._entries = {}  # id -> {'description', 'optimized', 'platform'}
+        self._next_id = 0
+        self.stats = {
+            'items': 0,
+            'clusters': 0,
+            'batch_duplicates': 0,
+            'history_duplicates': 0
+        }
+
+    def _index(self, platform: str, context: str, description: str) -> MinHashIndex:
+        key = (platform, normalize(context or ''), numbers(description))
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = MinHashIndex(self.num_perm, self.bands)
+        return index
+
+    def _signature(self, index: MinHashIndex, description: str) -> tuple:
+        return index.signature(shingles(normalize(description), self.shingle_size))
+
+    def _new_entry(self, description: str, platform: str, optimized: str = None) -> int:
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = {
+            'description': description,
+            'platform': platform,
+            'optimized': optimized
+        }
+        return entry_id
+
+    def plan(self, items: list):
+        """
+        Separa os itens que precisam ir ao modelo
+
+        Args:
+            items: Lista de dicionários com 'description', 'platform' e 'context'
+
+        Returns:
+            tuple: (itens únicos, plano), onde o plano tem, para cada item, uma
+                tupla (tipo, id da entrada, similaridade) com tipo 'new' (vai ao
+                modelo), 'batch' (duplicado de outro item do lote) ou 'history'
+                (duplicado de um resultado anterior)
+        """
+        unique = []
+        assignments = []
+        created = set()
+        with self._lock:
+            for item in items:
+                platform = item.get('platform', 'instagram')
+                index = self._index(platform, item.get('context', ''), item['description'])
+                signature = self._signature(index, item['description'])
+                entry_id, similarity = index.query(signature, self.threshold)
+
+                if entry_id in created:
+                    assignments.append(('batch', entry_id, similarity))
+                    self.stats['batch_duplicates'] += 1
+                elif entry_id is not None and self._entries[entry_id]['optimized'] is not None:
+                    assignments.append(('history', entry_id, similarity))
+                    self.stats['history_duplicates'] += 1
+                else:
+                    # Sem vizinho (ou vizinho ainda em andamento em outro lote)
+                    entry_id = self._new_entry(item['description'], platform)
+                    index.add(entry_id, signature)
+                    created.add(entry_id)
+                    unique.append(item)
+                    assignments.append(('new', entry_id, 1.0))
+                    self.stats['clusters'] += 1
+                self.stats['items'] += 1
+
+        return unique, assignments
+
+    def fan_out(self, items: list, assignments: list, unique_results: list, build_result) -> list:
+        """
+        Distribui os resultados dos itens únicos para os itens duplicados
+
+        Args:
+            items: Os mesmos itens passados para plan
+            assignments: O plano retornado por plan
+            unique_results: Resultados dos itens únicos, na ordem retornada por plan
+            build_result: Função (original, otimizada, plataforma, context=...) -> resultado
+
+        Returns:
+            list: Um resultado por item, na ordem de entrada
+        """
+        by_entry = {}
+        position = 0
+        for kind, entry_id, _ in assignments:
+            if kind == 'new':
+                by_entry[entry_id] = unique_results[position]
+                position += 1
+
+        with self._lock:
+            # Resultados bem-sucedidos passam a valer para os próximos lotes
+            for entry_id, result in by_entry.items():
+                if result['success']:
+                    self._entries[entry_id]['optimized'] = result['optimized_description']
+                else:
+                    self._discard(entry_id)
+
+        results = []
+        for item, (kind, entry_id, similarity) in zip(items, assignments):
+            if kind == 'new':
+                results.append(by_entry[entry_id])
+                continue
+
+            source = by_entry.get(entry_id)
+            if kind == 'batch' and not source['success']:
+                results.append({**source, 'original_description': item['description']})
+                continue
+
+            entry = self._entries[entry_id] if kind == 'history' else None
+            optimized = source['optimized_description'] if kind == 'batch' else entry['optimized']
+            original = source['original_description'] if kind == 'batch' else entry['description']
+            result = build_result(
+                item['description'], optimized, item.get('platform', 'instagram'), context=item.get('context', '')
+            )
+            result['duplicate_of'] = original
+            result['similarity'] = round(similarity, 3)
+            results.append(result)
+
+        return results
+
+    def _discard(self, entry_id: int):
+        """Remove do índice uma entrada cuja otimização falhou (chamado com o lock)"""
+        entry = self._entries.pop(entry_id)
+        for index in self._indexes.values():
+            index.remove(entry_id)
+        return entry
+
+    def add_result(self, result: dict, context: str = None):
+        """
+        Registra um resultado anterior (por exemplo, de um arquivo de saída) para reaproveitamento
+
+        O contexto padrão é o campo 'context' do resultado, gravado por PostOptimizer.
+        """
+        if not result.get('success'):
+            return
+        if context is None:
+            context = result.get('context', '')
+        with self._lock:
+            index = self._index(result['platform'], context, result['original_description'])
+            entry_id = self._new_entry(
+                result['original_description'], result['platform'], result['optimized_description']
+            )
+            index.add(entry_id, self._signature(index, result['original_description']))
+
+    def report(self) -> dict:
+        """Resumo acumulado: itens, grupos e chamadas à API economizadas"""
+        with self._lock:
+            report = dict(self.stats)
+        report['calls_saved'] = report['batch_duplicates'] + report['history_duplicates']
+        return report
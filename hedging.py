@@ -0,0 +1,180 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError as FutureTimeoutError, wait
+
+from backends import LLMBackend, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class HedgedBackend(LLMBackend):
+    """
+    Requisições "hedged": uma cópia da requisição quando a primeira demora demais
+
+    Se a requisição não responde até o percentil `percentile` das latências
+    recentes, uma segunda requisição idêntica é enviada e vale a que terminar
+    primeiro; a outra é ignorada (a API não permite cancelar uma chamada em
+    andamento, então seus tokens ainda contam na quota). O número de cópias
+    fica limitado a `budget` vezes o número de requisições, e cada cópia só é
+    enviada se o limitador de taxa tiver folga naquele momento.
+
+    Só generate() é protegido; generate_stream() repassa direto ao backend.
+    """
+
+    def __init__(self, backend: LLMBackend, percentile: float = 0.9, budget: float = 0.1,
+                 min_samples: int = 20, window: int = 200, min_delay: float = 0.05,
+                 rate_limiter=None, instrumentation=None):
+        """
+        Args:
+            backend: Backend protegido
+            percentile: Percentil das latências recentes que dispara a cópia (ex.: 0.9)
+            budget: Fração máxima de requisições extras (ex.: 0.1 = até 10% a mais)
+            min_samples: Latências observadas antes de enviar a primeira cópia
+            window: Número de latências recentes consideradas no percentil
+            min_delay: Espera mínima, em segundos, antes de uma cópia
+            rate_limiter: Opcional, limitador consultado (sem esperar) antes de cada cópia
+            instrumentation: Opcional, recebe os contadores hedges_total,
+                hedges_won_total e hedge_extra_tokens_total
+        """
+        if not 0 < percentile < 1:
+            raise ValueError(f"Percentil inválido: {percentile}. Use um valor em (0, 1)")
+
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.rate_limiter = rate_limiter
+        self.instrumentation = instrumentation
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'hedges': 0,
+            'hedges_won': 0,
+            'skipped_budget': 0,
+            'skipped_rate_limit': 0,
+            'extra_prompt_tokens': 0,
+            'extra_output_tokens': 0
+        }
+
+    def __getattr__(self, name):
+        # Expõe o restante da interface do backend protegido (por exemplo, pool_stats)
+        return getattr(self.__dict__.get('backend'), name)
+
+    def hedge_delay(self):
+        """Espera antes de enviar uma cópia, ou None se ainda não houver latências suficientes"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        position = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay, ordered[position])
+
+    def _start(self, prompt: str, temperature: float, max_output_tokens: int) -> Future:
+        """Executa a requisição em uma thread própria e registra sua latência ao terminar"""
+        future = Future()
+
+        def run():
+            start = time.perf_counter()
+            try:
+                response = self.backend.generate(prompt, temperature, max_output_tokens)
+            except BaseException as e:
+                future.set_exception(e)
+                return
+            with self._lock:
+                self._latencies.append(time.perf_counter() - start)
+            future.set_result(response)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def _allow_hedge(self, prompt: str, max_output_tokens: int) -> bool:
+        """Verifica o orçamento de cópias e a folga do limitador, reservando ambos"""
+        with self._lock:
+            if self.stats['hedges'] + 1 > self.budget * self.stats['requests']:
+                self.stats['skipped_budget'] += 1
+                return False
+
+        if self.rate_limiter is not None and not self.rate_limiter.try_acquire(
+            estimate_tokens(prompt) + max_output_tokens
+        ):
+            with self._lock:
+                self.stats['skipped_rate_limit'] += 1
+            return False
+
+        with self._lock:
+            self.stats['hedges'] += 1
+        self._increment('hedges_total')
+        return True
+
+    def _count_extra(self, future: Future):
+        """Soma os tokens da requisição descartada ao custo das cópias"""
+        def record(done: Future):
+            if done.cancelled() or done.exception() is not None:
+                return
+            response = done.result()
+            with self._lock:
+                self.stats['extra_prompt_tokens'] += response['prompt_tokens']
+                self.stats['extra_output_tokens'] += response['output_tokens']
+            self._increment('hedge_extra_tokens_total', response['prompt_tokens'] + response['output_tokens'])
+
+        future.add_done_callback(record)
+
+    def generate(self, prompt: str, temperature: float, max_output_tokens: int) -> dict:
+        with self._lock:
+            self.stats['requests'] += 1
+
+        primary = self._start(prompt, temperature, max_output_tokens)
+        delay = self.hedge_delay()
+        if delay is None:
+            return primary.result()
+
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+
+        if not self._allow_hedge(prompt, max_output_tokens):
+            return primary.result()
+
+        logger.info(f"Requisição sem resposta após {delay:.2f}s; enviando cópia")
+        hedge = self._start(prompt, temperature, max_output_tokens)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+
+                if future is hedge:
+                    with self._lock:
+                        self.stats['hedges_won'] += 1
+                    self._increment('hedges_won_total')
+                self._count_extra(primary if future is hedge else hedge)
+                return future.result()
+
+        # As duas requisições falharam
+        raise error
+
+    def _increment(self, name: str, value: float = 1):
+        if self.instrumentation is not None:
+            self.instrumentation.increment(name, value)
+
+    def generate_stream(self, prompt: str, temperature: float, max_output_tokens: int):
+        return self.backend.generate_stream(prompt, temperature, max_output_tokens)
+
+    def hedge_stats(self) -> dict:
+        """Cópias enviadas e vencedoras, quota extra gasta e o atraso atual do gatilho"""
+        delay = self.hedge_delay()
+        with self._lock:
+            stats = dict(self.stats)
+        stats['extra_requests'] = stats['hedges']
+        stats['hedge_delay'] = delay
+        stats['win_rate'] = stats['hedges_won'] / stats['hedges'] if stats['hedges'] else 0.0
+        return stats
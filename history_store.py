@@ -0,0 +1,233 @@
+import json
+import sqlite3
+import threading
+import time
+
+# Métricas gravadas em colunas próprias, filtráveis em query/count; as de _INDEXED_METRICS têm índice
+METRIC_COLUMNS = (
+    'original_length',
+    'optimized_length',
+    'length_change',
+    'hashtag_count',
+    'emoji_count',
+    'question_count',
+    'exclamation_count',
+)
+
+_INDEXED_METRICS = ('optimized_length', 'hashtag_count', 'emoji_count', 'question_count', 'exclamation_count')
+
+
+class HistoryStore:
+    """
+    Histórico persistente (SQLite) dos resultados de otimização
+
+    Cada resultado vira uma linha com a plataforma, o instante, as métricas em
+    colunas indexadas e o resultado completo em JSON, e as descrições entram em
+    um índice de texto completo (FTS5, com LIKE como alternativa quando o
+    SQLite não tem FTS5). As consultas filtram e paginam no banco, sem carregar
+    o histórico inteiro em memória.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Caminho do arquivo SQLite (':memory:' para histórico só em memória)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        # timeout: vários processos (por exemplo, --shards) podem gravar no mesmo arquivo
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+
+        metric_columns = ",\n".join(f"{column} INTEGER" for column in METRIC_COLUMNS)
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY,
+                created_at REAL NOT NULL,
+                platform TEXT,
+                success INTEGER NOT NULL,
+                original_description TEXT NOT NULL,
+                optimized_description TEXT,
+                error TEXT,
+                {metric_columns},
+                cached INTEGER,
+                served_by TEXT,
+                finish_reason TEXT,
+                prompt_tokens INTEGER,
+                output_tokens INTEGER,
+                result TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_history_created ON history (created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_history_platform ON history (platform, created_at)")
+        for column in _INDEXED_METRICS:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_history_{column} ON history ({column})")
+
+        self.full_text = self._create_fts()
+        self._conn.commit()
+
+    def _create_fts(self) -> bool:
+        """Cria o índice FTS5 das descrições, mantido por triggers; False se o SQLite não tiver FTS5"""
+        try:
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                    original_description, optimized_description,
+                    content='history', content_rowid='id'
+                )
+            """)
+        except sqlite3.OperationalError:
+            return False
+
+        self._conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+                INSERT INTO history_fts (rowid, original_description, optimized_description)
+                VALUES (new.id, new.original_description, new.optimized_description);
+            END
+        """)
+        self._conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+                INSERT INTO history_fts (history_fts, rowid, original_description, optimized_description)
+                VALUES ('delete', old.id, old.original_description, old.optimized_description);
+            END
+        """)
+        return True
+
+    @staticmethod
+    def _row(result: dict, created_at: float) -> tuple:
+        metrics = result.get('metrics') or {}
+        usage = result.get('usage') or {}
+        # Itens de uma requisição empacotada trazem o uso da requisição inteira; cada linha
+        # guarda a sua parte, para que as somas contem a requisição uma única vez
+        shared_by = usage.get('shared_by') or 1
+        return (
+            created_at,
+            result.get('platform'),
+            int(bool(result.get('success'))),
+            result.get('original_description', ''),
+            result.get('optimized_description'),
+            result.get('error'),
+            *(metrics.get(column) for column in METRIC_COLUMNS),
+            int(bool(result.get('cached'))),
+            result.get('served_by'),
+            result.get('finish_reason'),
+            *(usage[key] / shared_by if usage.get(key) is not None else None
+              for key in ('prompt_tokens', 'output_tokens')),
+            json.dumps(result, ensure_ascii=False)
+        )
+
+    def add_many(self, results: list, created_at: float = None):
+        """Grava vários resultados em uma única transação"""
+        created_at = created_at or time.time()
+        columns = (
+            "created_at, platform, success, original_description, optimized_description, error, "
+            + ", ".join(METRIC_COLUMNS)
+            + ", cached, served_by, finish_reason, prompt_tokens, output_tokens, result"
+        )
+        placeholders = ", ".join("?" * len(columns.split(", ")))
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT INTO history ({columns}) VALUES ({placeholders})",
+                [self._row(result, created_at) for result in results]
+            )
+            self._conn.commit()
+
+    def add(self, result: dict, created_at: float = None):
+        self.add_many([result], created_at)
+
+    def _where(self, platform=None, since: float = None, until: float = None, text: str = None,
+               metrics: dict = None, success: bool = None):
+        """
+        Monta a cláusula WHERE dos filtros
+
+        Args:
+            platform: Plataforma ou lista de plataformas
+            since / until: Intervalo de created_at (timestamps Unix)
+            text: Palavras que devem aparecer nas descrições (substring, sem FTS5)
+            metrics: Dicionário métrica -> (mínimo, máximo); None em um limite o ignora
+            success: Filtra sucessos (True) ou falhas (False)
+        """
+        clauses, params = [], []
+        if platform:
+            platforms = [platform] if isinstance(platform, str) else list(platform)
+            clauses.append(f"platform IN ({', '.join('?' * len(platforms))})")
+            params.extend(platforms)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if success is not None:
+            clauses.append("success = ?")
+            params.append(int(success))
+        for column, (minimum, maximum) in (metrics or {}).items():
+            if column not in METRIC_COLUMNS:
+                raise ValueError(f"Métrica inválida: {column}. Use: {', '.join(METRIC_COLUMNS)}")
+            if minimum is not None:
+                clauses.append(f"{column} >= ?")
+                params.append(minimum)
+            if maximum is not None:
+                clauses.append(f"{column} <= ?")
+                params.append(maximum)
+        if text:
+            if self.full_text:
+                # Cada palavra vira uma frase entre aspas, então pontuação e '#' não quebram a sintaxe do FTS5
+                terms = " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+                clauses.append("id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)")
+                params.append(terms)
+            else:
+                clauses.append("(original_description LIKE ? OR optimized_description LIKE ?)")
+                params.extend([f"%{text}%"] * 2)
+
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, limit: int = 50, offset: int = 0, **filters) -> list:
+        """
+        Página de resultados, do mais recente ao mais antigo
+
+        Args:
+            limit / offset: Tamanho e início da página
+            **filters: Filtros de _where (platform, since, until, text, metrics, success)
+
+        Returns:
+            list: Dicionários com as colunas do histórico (sem o JSON completo)
+        """
+        where, params = self._where(**filters)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM history{where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [{key: row[key] for key in row.keys() if key != 'result'} for row in rows]
+
+    def count(self, **filters) -> int:
+        where, params = self._where(**filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM history{where}", params).fetchone()[0]
+
+    def get(self, entry_id: int) -> dict:
+        """Resultado completo, como retornado pelo PostOptimizer, ou None"""
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM history WHERE id = ?", (entry_id,)).fetchone()
+        return json.loads(row['result']) if row else None
+
+    def summary(self, **filters) -> list:
+        """Totais e médias das métricas por plataforma, calculados no banco"""
+        where, params = self._where(**filters)
+        averages = ", ".join(f"AVG({column}) AS {column}" for column in _INDEXED_METRICS)
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT platform, COUNT(*) AS posts, SUM(success) AS successes,
+                       CAST(ROUND(SUM(COALESCE(prompt_tokens, 0) + COALESCE(output_tokens, 0))) AS INTEGER) AS tokens,
+                       {averages}
+                FROM history{where}
+                GROUP BY platform ORDER BY posts DESC
+            """, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
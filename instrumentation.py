@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores (em segundos) dos buckets dos histogramas de latência
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    """Histograma cumulativo no formato do Prometheus"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # o último bucket é +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, fraction: float) -> float:
+        """Estimativa do quantil por interpolação linear dentro do bucket"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= target and count:
+                # Os extremos observados delimitam o primeiro e o último bucket
+                lower = max(self.buckets[i - 1] if i > 0 else self.min, self.min)
+                upper = min(self.buckets[i] if i < len(self.buckets) else self.max, self.max)
+                return lower + (upper - lower) * (target - cumulative) / count
+            cumulative += count
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'max': self.max if self.count else 0.0,
+            'p50': self.quantile(0.50),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99)
+        }
+
+
+class Instrumentation:
+    """
+    Contadores, histogramas e eventos do PostOptimizer
+
+    Os dados podem ser exportados no formato texto do Prometheus ou como um
+    resumo JSON. Funções registradas com subscribe recebem cada evento
+    (nome, dados) assim que ele acontece.
+    """
+
+    def __init__(self, prefix: str = 'post_optimizer', buckets: tuple = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Registra callback(evento, dados) para receber os eventos emitidos"""
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def emit(self, event: str, **data):
+        for callback in list(self._subscribers):
+            try:
+                callback(event, data)
+            except Exception as e:
+                logger.warning(f"Erro em assinante de instrumentação ({event}): {str(e)}")
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Mede a duração do bloco no histograma `name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def counter(self, name: str) -> float:
+        return self._counters.get(name, 0)
+
+    def summary(self) -> dict:
+        """Resumo JSON de todos os contadores e histogramas"""
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'histograms': {name: histogram.summary() for name, histogram in self._histograms.items()}
+            }
+
+    def to_prometheus(self) -> str:
+        """Exporta os dados no formato texto do Prometheus"""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self._counters.items()):
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value:g}")
+
+            for name, histogram in sorted(self._histograms.items()):
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{le="{bound:g}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum {histogram.sum:g}")
+                lines.append(f"{metric}_count {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
@@ -0,0 +1,170 @@
+from array import array
+from bisect import bisect_right
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional; sem ele as colunas usam array da stdlib
+    np = None
+
+METRIC_COLUMNS = (
+    'original_length',
+    'optimized_length',
+    'length_change',
+    'hashtag_count',
+    'emoji_count',
+    'question_count',
+    'exclamation_count',
+)
+
+# Intervalos de code points com apresentação de emoji (ordenados, inclusivos)
+_EMOJI_RANGES = (
+    (0x231A, 0x231B), (0x23E9, 0x23F3), (0x23F8, 0x23FA), (0x24C2, 0x24C2),
+    (0x25AA, 0x25AB), (0x25B6, 0x25B6), (0x25C0, 0x25C0), (0x25FB, 0x25FE),
+    (0x2600, 0x27BF), (0x2934, 0x2935), (0x2B05, 0x2B07), (0x2B1B, 0x2B1C),
+    (0x2B50, 0x2B50), (0x2B55, 0x2B55), (0x3030, 0x3030), (0x303D, 0x303D),
+    (0x3297, 0x3297), (0x3299, 0x3299), (0x1F000, 0x1FAFF),
+)
+_EMOJI_STARTS = [start for start, _ in _EMOJI_RANGES]
+_EMOJI_ENDS = [end for _, end in _EMOJI_RANGES]
+
+_REGIONAL_INDICATORS = (0x1F1E6, 0x1F1FF)
+_SKIN_TONES = (0x1F3FB, 0x1F3FF)
+_TAGS = (0xE0020, 0xE007F)
+_VARIATION_SELECTORS = ('\ufe0e', '\ufe0f')
+_KEYCAP = '\u20e3'
+_ZWJ = '\u200d'
+
+
+def _is_emoji(code_point: int) -> bool:
+    index = bisect_right(_EMOJI_STARTS, code_point) - 1
+    return index >= 0 and code_point <= _EMOJI_ENDS[index]
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+def _consume_emoji_cluster(text: str, i: int) -> int:
+    """Avança sobre modificadores e sequências ZWJ que compõem o mesmo emoji"""
+    length = len(text)
+    while i < length:
+        char = text[i]
+        code_point = ord(char)
+        if char in _VARIATION_SELECTORS or char == _KEYCAP \
+                or _SKIN_TONES[0] <= code_point <= _SKIN_TONES[1] \
+                or _TAGS[0] <= code_point <= _TAGS[1]:
+            i += 1
+        elif char == _ZWJ and i + 1 < length:
+            i += 2  # o caractere após o ZWJ faz parte do mesmo grafema
+        else:
+            break
+    return i
+
+
+def text_metrics(text: str) -> dict:
+    """
+    Calcula as métricas de um texto em uma única passagem
+
+    Emojis são contados por grafema (👍🏽, 👨‍👩‍👧, 🇧🇷 e 1️⃣ contam como um) e
+    letras acentuadas não contam como emoji. Hashtags são tokens '#palavra'
+    que não estão colados a uma palavra anterior.
+    """
+    hashtags = emojis = questions = exclamations = 0
+    length = len(text)
+    i = 0
+
+    while i < length:
+        char = text[i]
+
+        if char == '?':
+            questions += 1
+        elif char == '!':
+            exclamations += 1
+        elif char == '#' or char == '*' or '0' <= char <= '9':
+            # Keycaps (#️⃣, 1️⃣) são emojis, não hashtags
+            j = i + 1
+            if j < length and text[j] == '\ufe0f':
+                j += 1
+            if j < length and text[j] == _KEYCAP:
+                emojis += 1
+                i = j + 1
+                continue
+            if char == '#' and j == i + 1 and i + 1 < length and _is_word_char(text[i + 1]) \
+                    and (i == 0 or not _is_word_char(text[i - 1])):
+                hashtags += 1
+        elif char >= '\u00a9':
+            code_point = ord(char)
+            if _REGIONAL_INDICATORS[0] <= code_point <= _REGIONAL_INDICATORS[1]:
+                # Bandeiras são pares de indicadores regionais
+                emojis += 1
+                if i + 1 < length and _REGIONAL_INDICATORS[0] <= ord(text[i + 1]) <= _REGIONAL_INDICATORS[1]:
+                    i += 1
+                i = _consume_emoji_cluster(text, i + 1)
+                continue
+            if _is_emoji(code_point) or (i + 1 < length and text[i + 1] == '\ufe0f'):
+                emojis += 1
+                i = _consume_emoji_cluster(text, i + 1)
+                continue
+
+        i += 1
+
+    return {
+        'length': length,
+        'hashtag_count': hashtags,
+        'emoji_count': emojis,
+        'question_count': questions,
+        'exclamation_count': exclamations
+    }
+
+
+def calculate_metrics(original: str, optimized: str) -> dict:
+    """Métricas de comparação entre a descrição original e a otimizada"""
+    metrics = text_metrics(optimized)
+    return {
+        'original_length': len(original),
+        'optimized_length': metrics['length'],
+        'length_change': metrics['length'] - len(original),
+        'hashtag_count': metrics['hashtag_count'],
+        'emoji_count': metrics['emoji_count'],
+        'question_count': metrics['question_count'],
+        'exclamation_count': metrics['exclamation_count']
+    }
+
+
+def batch_metrics(originals, optimizeds) -> dict:
+    """
+    Calcula as métricas de uma coluna de textos
+
+    Returns:
+        dict: Uma coluna por métrica (numpy.ndarray se o numpy estiver
+            instalado, array('q') caso contrário), alinhada com a entrada
+    """
+    columns = {name: array('q') for name in METRIC_COLUMNS}
+
+    for original, optimized in zip(originals, optimizeds):
+        metrics = calculate_metrics(original, optimized)
+        for name in METRIC_COLUMNS:
+            columns[name].append(metrics[name])
+
+    if np is not None:
+        return {name: np.frombuffer(column, dtype=np.int64) for name, column in columns.items()}
+    return columns
+
+
+def results_metrics(results: list) -> dict:
+    """Métricas colunares dos resultados bem-sucedidos de batch_optimize"""
+    successes = [result for result in results if result.get('success')]
+    return batch_metrics(
+        (result['original_description'] for result in successes),
+        (result['optimized_description'] for result in successes)
+    )
+
+
+def summarize(columns: dict) -> dict:
+    """Total e média de cada coluna de métricas"""
+    summary = {}
+    for name, column in columns.items():
+        count = len(column)
+        total = int(sum(column)) if np is None else int(column.sum())
+        summary[name] = {'total': total, 'mean': total / count if count else 0.0}
+    return summary
@@ -0,0 +1,224 @@
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+from backends import GeminiBackend, LLMBackend, QuotaExceededError
+from config import Config
+from retry_scheduler import RetryScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMember:
+    """Um par chave/modelo do pool, com carga, latência e quota acompanhadas"""
+
+    # Peso da última observação na média móvel exponencial da latência
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, label: str, backend: LLMBackend, rank: int, requests_per_minute: int = 0):
+        self.label = label
+        self.backend = backend
+        self.rank = rank
+        self.requests_per_minute = requests_per_minute
+        self.in_flight = 0
+        self.latency = None
+        self.cooldown_until = 0.0
+        self.window = deque()
+        self.stats = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'slow': 0}
+
+    def available(self, now: float) -> bool:
+        """Fora de cooldown e com quota no minuto corrente (chamado com o lock do pool)"""
+        if now < self.cooldown_until:
+            return False
+        while self.window and now - self.window[0] >= 60:
+            self.window.popleft()
+        return not self.requests_per_minute or len(self.window) < self.requests_per_minute
+
+    def score(self) -> float:
+        """Custo estimado de uma nova requisição: latência média vezes a fila atual"""
+        latency = self.latency if self.latency is not None else 0.0
+        return latency * (1 + self.in_flight)
+
+    def observe(self, latency: float):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.EWMA_ALPHA * (latency - self.latency)
+
+
+class ModelPoolBackend(LLMBackend):
+    """
+    Pool de pares chave/modelo com roteamento por carga e latência
+
+    Os modelos são usados na ordem de preferência: enquanto algum par do
+    modelo preferido estiver disponível, a requisição vai para o par desse
+    modelo com menor custo estimado (latência média x requisições em
+    andamento). Um 429 coloca o par em cooldown e a requisição é repetida
+    imediatamente no próximo par; pares que ultrapassam o SLO de latência
+    ficam em cooldown curto, deslocando as próximas requisições para os
+    demais. Só quando todos os pares falham o erro chega ao RetryScheduler.
+    """
+
+    def __init__(self, members: list, latency_slo: float = 0, requests_per_minute: int = 0,
+                 slow_cooldown: float = 30.0, quota_cooldown: float = 60.0,
+                 daily_cooldown: float = 3600.0):
+        """
+        Args:
+            members: Lista de tuplas (rótulo, backend), na ordem de preferência dos modelos
+            latency_slo: Latência máxima, em segundos, antes de afastar o par (0 desativa)
+            requests_per_minute: Quota por par no minuto (0 desativa)
+            slow_cooldown: Tempo afastado após ultrapassar o SLO
+            quota_cooldown: Tempo afastado após um 429 sem tempo de espera informado
+            daily_cooldown: Tempo afastado após esgotar a quota diária
+        """
+        if not members:
+            raise ValueError("O pool precisa de ao menos um par chave/modelo")
+
+        ranks = {}
+        self.members = []
+        for label, backend in members:
+            rank = ranks.setdefault(backend.model_name, len(ranks))
+            self.members.append(PoolMember(label, backend, rank, requests_per_minute))
+
+        self.model_name = "pool:" + ",".join(ranks)
+        self.latency_slo = latency_slo
+        self.slow_cooldown = slow_cooldown
+        self.quota_cooldown = quota_cooldown
+        self.daily_cooldown = daily_cooldown
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls):
+        """Cria o pool a partir de GEMINI_API_KEYS e GEMINI_MODELS (um par por chave e modelo)"""
+        keys = [key.strip() for key in (Config.GEMINI_API_KEYS or Config.GEMINI_API_KEY or '').split(',') if key.strip()]
+        models = [model.strip() for model in (Config.GEMINI_MODELS or Config.GEMINI_MODEL).split(',') if model.strip()]
+        if not keys:
+            raise ValueError("Nenhuma chave encontrada. Configure GEMINI_API_KEYS (ou GEMINI_API_KEY) no arquivo .env")
+
+        members = [
+            (f"key{i + 1}/{model}", GeminiBackend(api_key=key, model_name=model))
+            for model in models
+            for i, key in enumerate(keys)
+        ]
+        return cls(members, latency_slo=Config.POOL_LATENCY_SLO, requests_per_minute=Config.POOL_RPM)
+
+    def _acquire(self, tried: set) -> PoolMember:
+        """Escolhe o par de menor custo do modelo mais preferido que ainda tem pares disponíveis"""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [
+                member for member in self.members
+                if member.label not in tried and member.available(now)
+            ]
+            if not candidates:
+                return None
+
+            member = min(candidates, key=lambda member: (member.rank, member.score()))
+            member.in_flight += 1
+            member.window.append(now)
+            member.stats['requests'] += 1
+            return member
+
+    def _time_until_available(self) -> float:
+        """Segundos até algum par sair do cooldown ou recuperar quota no minuto"""
+        with self._lock:
+            now = time.monotonic()
+            waits = []
+            for member in self.members:
+                wait = member.cooldown_until - now
+                if member.requests_per_minute and len(member.window) >= member.requests_per_minute:
+                    wait = max(wait, member.window[0] + 60 - now)
+                waits.append(wait)
+            return max(0.001, min(waits))
+
+    def _release(self, member: PoolMember, latency: float = None, error: Exception = None):
+        with self._lock:
+            member.in_flight -= 1
+            if error is not None:
+                member.stats['errors'] += 1
+                kind = RetryScheduler.classify(error)
+                if kind is not None:
+                    member.stats['rate_limited'] += 1
+                    delay = RetryScheduler.parse_retry_delay(error)
+                    if delay is None:
+                        delay = self.daily_cooldown if kind == 'daily' else self.quota_cooldown
+                    member.cooldown_until = time.monotonic() + delay
+                    logger.warning(f"Par {member.label} em cooldown por {delay:.0f}s após 429")
+                return
+
+            member.observe(latency)
+            if self.latency_slo and latency > self.latency_slo:
+                member.stats['slow'] += 1
+                member.cooldown_until = time.monotonic() + self.slow_cooldown
+                logger.warning(f"Par {member.label} acima do SLO ({latency:.1f}s > {self.latency_slo:g}s)")
+
+    def _fallback(self, operation):
+        """
+        Executa operation(member) no melhor par, passando ao próximo em caso de 429
+
+        Returns:
+            tuple: (membro, instante de início, retorno de operation)
+        """
+        tried = set()
+        last_error = None
+        while True:
+            member = self._acquire(tried)
+            if member is None:
+                if last_error is not None:
+                    raise last_error
+                # Todos os pares afastados: um 429 faz o RetryScheduler esperar o primeiro voltar
+                raise QuotaExceededError('GenerateRequestsPerMinute', retry_delay=self._time_until_available())
+
+            tried.add(member.label)
+            start = time.perf_counter()
+            try:
+                value = operation(member)
+            except Exception as e:
+                self._release(member, error=e)
+                if RetryScheduler.classify(e) is None:
+                    raise
+                last_error = e
+                continue
+            return member, start, value
+
+    def generate(self, prompt: str, temperature: float, max_output_tokens: int) -> dict:
+        member, start, response = self._fallback(
+            lambda member: member.backend.generate(prompt, temperature, max_output_tokens)
+        )
+        self._release(member, latency=time.perf_counter() - start)
+        return dict(response, served_by=member.label)
+
+    def generate_stream(self, prompt: str, temperature: float, max_output_tokens: int):
+        def open_stream(member):
+            stream = member.backend.generate_stream(prompt, temperature, max_output_tokens)
+            # Erros de quota surgem ao abrir o stream; o fallback só vale até a primeira parte
+            return stream, next(stream)
+
+        member, start, (stream, first) = self._fallback(open_stream)
+        error = None
+        try:
+            for chunk in itertools.chain([first], stream):
+                # A última parte traz o uso da requisição
+                yield dict(chunk, served_by=member.label) if 'model' in chunk else chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Também libera o par se o consumidor abandonar o stream
+            self._release(member, latency=time.perf_counter() - start, error=error)
+
+    def pool_stats(self) -> dict:
+        """Estado de cada par: carga, latência média, cooldown e contadores"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                member.label: dict(
+                    member.stats,
+                    in_flight=member.in_flight,
+                    latency=member.latency,
+                    cooling_down=max(0.0, member.cooldown_until - now)
+                )
+                for member in self.members
+            }
@@ -1,8 +1,20 @@
-import google.generativeai as genai
+from backends import (
+    BLOCKED_FINISH_REASONS, CONTINUATION_MARKER, BlockedResponseError, EmptyResponseError, LLMBackend,
+    create_backend
+)
 from config import Config
+from metrics import calculate_metrics
+from prompt_compiler import compile_template, compiled_prompt, output_budget, packed_output_budget
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache
+from rules import RuleSet, rewrite
+from retry_scheduler import RetryScheduler
+from instrumentation import Instrumentation
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import json
 import logging
+import re
 import time
-import random
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -11,19 +23,83 @@ logger = logging.getLogger(__name__)
 class PostOptimizer:
     """Agente para otimização de descrições de posts usando Google Gemini"""
     
-    def __init__(self):
-        """Inicializa o agente com as configurações do Gemini"""
-        if not Config.GEMINI_API_KEY:
-            raise ValueError("Chave da API do Gemini não encontrada. Configure GEMINI_API_KEY no arquivo .env")
+    def __init__(self, rate_limiter: RateLimiter = None, cache: ResponseCache = None,
+                 use_cache: bool = True, backend: LLMBackend = None,
+                 retry_scheduler: RetryScheduler = None, instrumentation: Instrumentation = None,
+                 deduplicator=None, hedging: bool = False, rules: RuleSet = None,
+                 fast_path: str = None, history=None):
+        """
+        Inicializa o agente com o backend de geração configurado
+        
+        Args:
+            rate_limiter: Limitador de taxa compartilhado (padrão: criado a partir do Config)
+            cache: Cache de respostas (padrão: criado a partir do Config)
+            use_cache: Se False, nenhuma resposta é lida ou gravada em cache
+            backend: Backend de geração (padrão: definido por Config.LLM_BACKEND)
+            retry_scheduler: Agendador de retries compartilhado (padrão: criado a partir do Config)
+            instrumentation: Coletor de métricas de execução (padrão: um novo coletor)
+            deduplicator: Opcional, dedup.Deduplicator que agrupa posts quase idênticos
+                nos lotes para chamar o modelo uma única vez por grupo
+            hedging: Envia uma cópia das requisições que passam do percentil
+                Config.HEDGE_PERCENTILE da latência (ver hedging.HedgedBackend)
+            rules: Regras por plataforma usadas nas sugestões e no atalho local
+                (padrão: RuleSet.from_config())
+            fast_path: Destino dos posts com score de regras >= Config.FAST_PATH_THRESHOLD:
+                'off' (vão ao modelo), 'skip' (texto mantido) ou 'template' (reescrita
+                local) (padrão: Config.FAST_PATH)
+            history: Opcional, history_store.HistoryStore onde cada resultado é gravado
+                assim que fica pronto
+        """
+        self.backend = backend or create_backend()
+        self.instrumentation = instrumentation or Instrumentation()
+        
+        # Todas as chamadas à API (inclusive retries) passam pelo mesmo limitador
+        self.rate_limiter = rate_limiter or RateLimiter(
+            requests_per_minute=Config.REQUESTS_PER_MINUTE,
+            tokens_per_minute=Config.TOKENS_PER_MINUTE
+        )
+        
+        if hedging:
+            from hedging import HedgedBackend
+            
+            # As cópias só saem se o limitador tiver folga, sem atrasar as demais requisições
+            self.backend = HedgedBackend(
+                self.backend,
+                percentile=Config.HEDGE_PERCENTILE,
+                budget=Config.HEDGE_BUDGET,
+                min_samples=Config.HEDGE_MIN_SAMPLES,
+                rate_limiter=self.rate_limiter,
+                instrumentation=self.instrumentation
+            )
+        
+        # Um 429 em qualquer requisição pausa todas as que usam o mesmo agendador
+        self.retry_scheduler = retry_scheduler or RetryScheduler(
+            max_retries=Config.RETRY_MAX_ATTEMPTS,
+            base_delay=Config.RETRY_BASE_DELAY,
+            daily_policy=Config.DAILY_QUOTA_POLICY
+        )
+        
+        self.deduplicator = deduplicator
+        self.history = history
         
-        # Configurar o Gemini
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(Config.GEMINI_MODEL)
+        self.rules = rules or RuleSet.from_config()
+        self.fast_path = fast_path or Config.FAST_PATH
+        if self.fast_path not in ('off', 'skip', 'template'):
+            raise ValueError(f"Atalho local inválido: {self.fast_path}. Use: off, skip, template")
+        
+        self.cache = None
+        if use_cache:
+            self.cache = cache or ResponseCache(
+                Config.CACHE_PATH,
+                max_entries=Config.CACHE_MAX_ENTRIES,
+                ttl=Config.CACHE_TTL
+            )
         
         logger.info("Agente de otimização de posts inicializado com sucesso")
     
     def optimize_post(self, original_description: str, platform: str = 'instagram', 
-                     additional_context: str = "") -> dict:
+                     additional_context: str = "", refresh_cache: bool = False,
+                     temperature: float = None, max_tokens: int = None, use_cache: bool = True) -> dict:
         """
         Otimiza a descrição de um post para maior engajamento
         
@@ -31,134 +107,784 @@ class PostOptimizer:
             original_description: Descrição original do post
             platform: Plataforma de destino (instagram, linkedin, twitter)
             additional_context: Contexto adicional (público-alvo, objetivo, etc.)
+            refresh_cache: Ignora a resposta em cache e grava a nova geração
+            temperature: Temperatura da geração (padrão: Config.TEMPERATURE)
+            max_tokens: Limite de tokens da resposta (padrão: orçamento da plataforma)
+            use_cache: Se False, esta chamada não lê nem grava o cache de respostas
         
         Returns:
             dict: Resultado da otimização com descrição otimizada e métricas
         """
+        start = time.perf_counter()
+        prescore = self._prescore(original_description, platform)
+        if prescore and prescore['decision'] != 'model':
+            return self._fast_path_result(original_description, platform, prescore, start, additional_context)
+        
         try:
-            # Validar plataforma
-            if platform not in Config.PROMPTS:
-                raise ValueError(f"Plataforma não suportada: {platform}. Use: {list(Config.PROMPTS.keys())}")
+            base_prompt = self._render_prompt(original_description, platform, additional_context)
+            max_tokens = max_tokens or output_budget(platform, original_description, additional_context)
             
-            # Construir prompt
-            base_prompt = Config.PROMPTS[platform].format(
-                original_description=original_description
-            )
+            # Consultar o cache antes de chamar a API
+            cache_key = None
+            cached = None
+            if self.cache and use_cache:
+                cache_key = self._cache_key(platform, base_prompt, temperature, max_tokens)
+                if not refresh_cache:
+                    cached = self.cache.get(cache_key)
             
-            # Adicionar contexto se fornecido
-            if additional_context:
-                base_prompt += f"\n\nContexto adicional: {additional_context}"
+            if cached is not None:
+                result = self._build_result(
+                    original_description, cached, platform, cached=True, context=additional_context
+                )
+            else:
+                response = self._generate(base_prompt, max_tokens, temperature)
+                optimized_description = response['text']
+                
+                # Um texto ainda truncado após as continuações não vai para o cache
+                if cache_key and response['finish_reason'] != 'MAX_TOKENS':
+                    self.cache.set(cache_key, optimized_description)
+                
+                result = self._build_result(
+                    original_description, optimized_description, platform,
+                    usage=self._usage(response, max_tokens),
+                    served_by=response.get('served_by', response['model']),
+                    finish_reason=response['finish_reason'],
+                    context=additional_context
+                )
             
-            # Gerar resposta otimizada com retry automático
-            max_retries = 3
-            base_delay = 6  # 6 segundos base (10 req/min = 1 req a cada 6 segundos)
-            
-            for attempt in range(max_retries):
-                try:
-                    response = self.model.generate_content(
-                        base_prompt,
-                        generation_config=genai.types.GenerationConfig(
-                            temperature=Config.TEMPERATURE,
-                            max_output_tokens=Config.MAX_TOKENS
-                        )
-                    )
-                    break  # Sucesso, sair do loop
-                    
-                except Exception as e:
-                    error_msg = str(e)
-                    if "429" in error_msg and attempt < max_retries - 1:
-                        # Erro de quota, aguardar e tentar novamente
-                        if "GenerateRequestsPerMinute" in error_msg:
-                            wait_time = base_delay + random.randint(2, 5)  # 6-11 segundos
-                        elif "GenerateRequestsPerDay" in error_msg:
-                            wait_time = 3600  # 1 hora
-                        else:
-                            wait_time = base_delay * 2 + random.randint(5, 15)  # 17-27 segundos
-                        
-                        logger.warning(f"Limite de quota atingido. Aguardando {wait_time} segundos antes da tentativa {attempt + 2}...")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        # Outro erro ou última tentativa, re-raise
-                        raise e
+        except Exception as e:
+            logger.error(f"Erro ao otimizar post: {str(e)}")
+            result = self._error_result(original_description, e)
+        
+        if prescore:
+            result['fast_path'] = prescore
+        self._record_post(result, time.perf_counter() - start)
+        return result
+    
+    def _render_prompt(self, original_description: str, platform: str,
+                       additional_context: str = "") -> str:
+        """Monta o prompt individual de um post"""
+        # Validar plataforma
+        if platform not in Config.PROMPTS:
+            raise ValueError(f"Plataforma não suportada: {platform}. Use: {list(Config.PROMPTS.keys())}")
+        
+        # Construir prompt a partir do template compilado (sem indentação e linhas em branco)
+        base_prompt = compiled_prompt(platform).format(
+            original_description=original_description
+        )
+        
+        # Adicionar contexto se fornecido
+        if additional_context:
+            base_prompt += f"\n\nContexto adicional: {additional_context}"
+        
+        return base_prompt
+    
+    def _cache_key(self, platform: str, prompt: str, temperature: float = None,
+                   max_tokens: int = None) -> str:
+        return ResponseCache.make_key(
+            self.backend.model_name, platform, prompt,
+            Config.TEMPERATURE if temperature is None else temperature,
+            max_tokens or Config.MAX_TOKENS
+        )
+    
+    def _item_cache_key(self, item: dict) -> str:
+        """Chave de cache de um item empacotado, a mesma que optimize_post usaria para ele"""
+        platform = item.get('platform', 'instagram')
+        context = item.get('context', '')
+        prompt = self._render_prompt(item['description'], platform, context)
+        return self._cache_key(platform, prompt, max_tokens=output_budget(platform, item['description'], context))
+    
+    def _call_model(self, prompt: str, max_output_tokens: int, temperature: float) -> dict:
+        """Uma requisição ao modelo, cadenciada pelo limitador e com retry coordenado"""
+        def request():
+            waited = self.rate_limiter.acquire(self._estimate_tokens(prompt, max_output_tokens))
+            self.instrumentation.observe('rate_limit_wait_seconds', waited)
             
-            optimized_description = response.text.strip()
+            start = time.perf_counter()
+            try:
+                response = self.backend.generate(
+                    prompt,
+                    temperature=temperature,
+                    max_output_tokens=max_output_tokens
+                )
+            except Exception as e:
+                self.instrumentation.increment('model_errors_total')
+                self.instrumentation.emit('model_error', error=str(e))
+                raise
             
-            # Calcular métricas básicas
-            metrics = self._calculate_metrics(original_description, optimized_description)
+            self._record_response(response, time.perf_counter() - start)
+            return response
+        
+        return self.retry_scheduler.run(request, listener=self._on_retry_event)
+    
+    def _generate(self, prompt: str, max_output_tokens: int = None, temperature: float = None) -> dict:
+        """
+        Chama o modelo com retry coordenado e retorna a resposta do backend (texto sem espaços nas pontas)
+        
+        Uma resposta bloqueada sem texto é repetida uma vez com ajustes (ver
+        _retry_blocked), e uma resposta interrompida por MAX_TOKENS é completada
+        com até Config.MAX_CONTINUATIONS continuações, em vez de refazer a geração.
+        
+        Raises:
+            BlockedResponseError: A resposta continuou bloqueada após a nova tentativa
+            EmptyResponseError: A geração terminou sem texto, mesmo após as continuações
+        """
+        max_output_tokens = max_output_tokens or Config.MAX_TOKENS
+        temperature = Config.TEMPERATURE if temperature is None else temperature
+        
+        response = self._call_model(prompt, max_output_tokens, temperature)
+        if response['finish_reason'] in BLOCKED_FINISH_REASONS and not response['text'].strip():
+            response = self._retry_blocked(prompt, max_output_tokens, response['finish_reason'])
+        
+        continuations = 0
+        while response['finish_reason'] == 'MAX_TOKENS' and continuations < Config.MAX_CONTINUATIONS:
+            continuation = self._call_model(
+                self._continuation_prompt(prompt, response['text']), max_output_tokens, temperature
+            )
+            continuations += 1
+            self.instrumentation.increment('continuations_total')
+            response = self._merge_continuation(response, continuation)
+        if continuations:
+            response['continuations'] = continuations
+        
+        if not response['text'].strip():
+            raise EmptyResponseError(response['finish_reason'])
+        return dict(response, text=response['text'].strip())
+    
+    def _retry_blocked(self, prompt: str, max_output_tokens: int, finish_reason: str) -> dict:
+        """Repete uma requisição bloqueada com temperatura menor e uma instrução de segurança"""
+        self.instrumentation.increment('blocked_responses_total')
+        self.instrumentation.emit('blocked_response', finish_reason=finish_reason)
+        logger.warning(f"Resposta bloqueada ({finish_reason}); tentando de novo com ajustes")
+        
+        response = self._call_model(
+            f"{prompt}\n\n{Config.BLOCKED_RETRY_NOTE}", max_output_tokens, Config.BLOCKED_RETRY_TEMPERATURE
+        )
+        if response['finish_reason'] in BLOCKED_FINISH_REASONS and not response['text'].strip():
+            self.instrumentation.increment('blocked_responses_total')
+            raise BlockedResponseError(response['finish_reason'])
+        return response
+    
+    def _continuation_prompt(self, prompt: str, partial: str) -> str:
+        """Prompt que pede ao modelo para continuar um texto interrompido, sem refazê-lo"""
+        return f"{prompt}\n\n{compile_template(Config.CONTINUATION_PROMPT)}\n\n{CONTINUATION_MARKER}\n{partial}"
+    
+    @staticmethod
+    def _merge_continuation(response: dict, continuation: dict) -> dict:
+        """Junta o texto e soma o uso de uma continuação à resposta interrompida"""
+        merged = dict(
+            continuation,
+            text=response['text'] + continuation['text'],
+            prompt_tokens=response['prompt_tokens'] + continuation['prompt_tokens'],
+            output_tokens=response['output_tokens'] + continuation['output_tokens']
+        )
+        cached_tokens = response.get('cached_tokens', 0) + continuation.get('cached_tokens', 0)
+        if cached_tokens:
+            merged['cached_tokens'] = cached_tokens
+        return merged
+    
+    def _usage(self, response: dict, max_output_tokens: int) -> dict:
+        """Uso de tokens de uma requisição, reportado no resultado"""
+        usage = {
+            'prompt_tokens': response['prompt_tokens'],
+            'output_tokens': response['output_tokens'],
+            'max_output_tokens': max_output_tokens
+        }
+        if response.get('cached_tokens'):
+            usage['cached_tokens'] = response['cached_tokens']
+        if response.get('continuations'):
+            usage['continuations'] = response['continuations']
+        return usage
+    
+    def _record_response(self, response: dict, latency: float):
+        """Registra latência e tokens de uma resposta completa do modelo"""
+        self.instrumentation.observe('model_request_seconds', latency)
+        self.instrumentation.increment('model_requests_total')
+        self.instrumentation.increment('prompt_tokens_total', response['prompt_tokens'])
+        self.instrumentation.increment('output_tokens_total', response['output_tokens'])
+        if response.get('cached_tokens'):
+            self.instrumentation.increment('cached_prompt_tokens_total', response['cached_tokens'])
+        self.instrumentation.emit(
+            'model_request',
+            latency=latency,
+            prompt_tokens=response['prompt_tokens'],
+            output_tokens=response['output_tokens'],
+            model=response['model']
+        )
+    
+    def optimize_post_stream(self, original_description: str, platform: str = 'instagram',
+                             additional_context: str = "", refresh_cache: bool = False,
+                             temperature: float = None, max_tokens: int = None, use_cache: bool = True):
+        """
+        Variante de optimize_post que produz o texto conforme o modelo o gera
+        
+        Métricas e sugestões são calculadas quando a geração termina. Retries de
+        quota só acontecem antes da primeira parte chegar.
+        
+        Yields:
+            dict: {'type': 'chunk', 'text': parte} para cada parte do texto e, por
+                fim, {'type': 'done', 'result': resultado}, com o resultado no
+                mesmo formato de optimize_post
+        """
+        start = time.perf_counter()
+        prescore = self._prescore(original_description, platform)
+        if prescore and prescore['decision'] != 'model':
+            result = self._fast_path_result(original_description, platform, prescore, start, additional_context)
+            yield {'type': 'chunk', 'text': result['optimized_description']}
+            yield {'type': 'done', 'result': result}
+            return
+        
+        try:
+            base_prompt = self._render_prompt(original_description, platform, additional_context)
+            max_tokens = max_tokens or output_budget(platform, original_description, additional_context)
             
-            return {
-                'success': True,
-                'original_description': original_description,
-                'optimized_description': optimized_description,
-                'platform': platform,
-                'metrics': metrics,
-                'suggestions': self._generate_suggestions(optimized_description, platform)
-            }
+            cache_key = None
+            cached = None
+            if self.cache and use_cache:
+                cache_key = self._cache_key(platform, base_prompt, temperature, max_tokens)
+                if not refresh_cache:
+                    cached = self.cache.get(cache_key)
             
+            if cached is not None:
+                yield {'type': 'chunk', 'text': cached}
+                result = self._build_result(
+                    original_description, cached, platform, cached=True, context=additional_context
+                )
+            else:
+                parts = []
+                usage = {}
+                for part in self._generate_stream(base_prompt, max_tokens, temperature, usage):
+                    parts.append(part)
+                    yield {'type': 'chunk', 'text': part}
+                finish_reason = usage.pop('finish_reason', None)
+                
+                if finish_reason in BLOCKED_FINISH_REASONS and not ''.join(parts).strip():
+                    # Nenhum texto chegou ao usuário, então a nova tentativa pode ser sem streaming
+                    response = self._retry_blocked(base_prompt, max_tokens, finish_reason)
+                    parts = [response['text']]
+                    yield {'type': 'chunk', 'text': response['text']}
+                    usage = dict(self._usage(response, max_tokens), served_by=response.get('served_by', response['model']))
+                    finish_reason = response['finish_reason']
+                
+                # Continuações seguem no mesmo stream, a partir do texto já exibido
+                continuations = 0
+                while finish_reason == 'MAX_TOKENS' and continuations < Config.MAX_CONTINUATIONS:
+                    step = {}
+                    continuation_prompt = self._continuation_prompt(base_prompt, ''.join(parts))
+                    for part in self._generate_stream(continuation_prompt, max_tokens, temperature, step):
+                        parts.append(part)
+                        yield {'type': 'chunk', 'text': part}
+                    continuations += 1
+                    self.instrumentation.increment('continuations_total')
+                    finish_reason = step.pop('finish_reason', None)
+                    for key in ('prompt_tokens', 'output_tokens', 'cached_tokens'):
+                        if key in usage or key in step:
+                            usage[key] = usage.get(key, 0) + step.get(key, 0)
+                    usage['served_by'] = step.get('served_by', usage.get('served_by'))
+                if continuations:
+                    usage['continuations'] = continuations
+                
+                optimized_description = ''.join(parts).strip()
+                if not optimized_description:
+                    raise EmptyResponseError(finish_reason)
+                if cache_key and finish_reason != 'MAX_TOKENS':
+                    self.cache.set(cache_key, optimized_description)
+                
+                served_by = usage.pop('served_by', None)
+                result = self._build_result(
+                    original_description, optimized_description, platform,
+                    usage=usage or None, served_by=served_by, finish_reason=finish_reason,
+                    context=additional_context
+                )
+        
         except Exception as e:
             logger.error(f"Erro ao otimizar post: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e),
-                'original_description': original_description
+            result = self._error_result(original_description, e)
+        
+        if prescore:
+            result['fast_path'] = prescore
+        self._record_post(result, time.perf_counter() - start)
+        yield {'type': 'done', 'result': result}
+    
+    def _generate_stream(self, prompt: str, max_output_tokens: int = None, temperature: float = None,
+                         usage: dict = None):
+        """
+        Chama o modelo em streaming e produz as partes do texto, medindo o tempo até a primeira
+        
+        Ao final, o uso de tokens da requisição (com served_by e finish_reason) é
+        gravado em `usage`, se fornecido.
+        """
+        max_output_tokens = max_output_tokens or Config.MAX_TOKENS
+        temperature = Config.TEMPERATURE if temperature is None else temperature
+        
+        def request():
+            waited = self.rate_limiter.acquire(self._estimate_tokens(prompt, max_output_tokens))
+            self.instrumentation.observe('rate_limit_wait_seconds', waited)
+            
+            start = time.perf_counter()
+            try:
+                stream = self.backend.generate_stream(
+                    prompt,
+                    temperature=temperature,
+                    max_output_tokens=max_output_tokens
+                )
+                # Erros de quota surgem ao abrir o stream, então a primeira parte fica dentro do retry
+                first = next(stream)
+            except Exception as e:
+                self.instrumentation.increment('model_errors_total')
+                self.instrumentation.emit('model_error', error=str(e))
+                raise
+            
+            ttft = time.perf_counter() - start
+            self.instrumentation.observe('time_to_first_token_seconds', ttft)
+            self.instrumentation.emit('first_token', latency=ttft)
+            return start, first, stream
+        
+        start, response, stream = self.retry_scheduler.run(request, listener=self._on_retry_event)
+        while True:
+            if response['text']:
+                yield response['text']
+            if 'model' in response:
+                break  # a última parte traz o uso da requisição
+            try:
+                response = next(stream)
+            except StopIteration:
+                return
+        
+        self._record_response(response, time.perf_counter() - start)
+        if usage is not None:
+            usage.update(self._usage(response, max_output_tokens))
+            usage['served_by'] = response.get('served_by', response['model'])
+            usage['finish_reason'] = response['finish_reason']
+    
+    def _on_retry_event(self, event: str, value):
+        """Repassa retries e esperas do agendador para a instrumentação"""
+        if event == 'retry':
+            self.instrumentation.increment('retries_total')
+        elif event == 'backoff':
+            self.instrumentation.increment('backoff_seconds_total', value)
+        self.instrumentation.emit(event, value=value)
+    
+    def _record_post(self, result: dict, latency: float):
+        """Registra latência, erros e uso do cache de um post otimizado"""
+        self.instrumentation.observe('optimize_post_seconds', latency)
+        self.instrumentation.increment('posts_total')
+        if not result['success']:
+            self.instrumentation.increment('posts_failed_total')
+        elif result.get('cached'):
+            self.instrumentation.increment('cache_hits_total')
+        elif self.cache:
+            self.instrumentation.increment('cache_misses_total')
+        self.instrumentation.emit('post', latency=latency, result=result)
+        self._save_history([result])
+    
+    def _save_history(self, results: list):
+        """Grava resultados no histórico; uma falha no histórico não invalida a otimização"""
+        if not self.history or not results:
+            return
+        try:
+            self.history.add_many(results)
+        except Exception as e:
+            logger.warning(f"Erro ao gravar o histórico: {str(e)}")
+    
+    def stats(self) -> dict:
+        """Resumo da instrumentação, com taxas de erro e de acerto do cache"""
+        summary = self.instrumentation.summary()
+        counter = self.instrumentation.counter
+        posts = counter('posts_total')
+        cache_lookups = counter('cache_hits_total') + counter('cache_misses_total')
+        summary['rates'] = {
+            'error_rate': counter('posts_failed_total') / posts if posts else 0.0,
+            'cache_hit_rate': counter('cache_hits_total') / cache_lookups if cache_lookups else 0.0
+        }
+        if hasattr(self.backend, 'pool_stats'):
+            summary['pool'] = self.backend.pool_stats()
+        if hasattr(self.backend, 'hedge_stats'):
+            summary['hedging'] = self.backend.hedge_stats()
+        context_cache = self.backend.context_cache_stats() if hasattr(self.backend, 'context_cache_stats') else None
+        if context_cache:
+            summary['context_cache'] = context_cache
+        return summary
+    
+    def optimize_packed(self, items: list, refresh_cache: bool = False) -> list:
+        """
+        Otimiza vários itens com uma única requisição ao modelo
+        
+        Os itens (posts e/ou variações de plataforma do mesmo post) são enviados
+        juntos, com as diretrizes de cada plataforma uma única vez, e a resposta
+        JSON é separada nos resultados individuais. Itens ausentes ou inválidos na
+        resposta são otimizados de novo individualmente.
+        
+        Args:
+            items: Lista de dicionários com 'description', 'platform' e 'context'
+            refresh_cache: Ignora respostas em cache e grava as novas gerações
+        
+        Returns:
+            list: Lista de resultados no mesmo formato de optimize_post, na ordem dos itens
+        """
+        start = time.perf_counter()
+        results = [None] * len(items)
+        prescores = [None] * len(items)
+        packed = []
+        
+        for i, item in enumerate(items):
+            platform = item.get('platform', 'instagram')
+            if platform not in Config.PROMPTS:
+                continue  # optimize_post reporta o erro individualmente
+            
+            prescores[i] = self._prescore(item['description'], platform)
+            if prescores[i] and prescores[i]['decision'] != 'model':
+                results[i] = self._fast_path_result(
+                    item['description'], platform, prescores[i], start, item.get('context', '')
+                )
+                continue
+            
+            if self.cache and not refresh_cache:
+                cached = self.cache.get(self._item_cache_key(item))
+                if cached is not None:
+                    results[i] = self._build_result(
+                        item['description'], cached, platform, cached=True, context=item.get('context', '')
+                    )
+                    continue
+            
+            packed.append(i)
+        
+        if len(packed) > 1:
+            try:
+                prompt = self._render_packed_prompt([items[i] for i in packed])
+                max_output_tokens = packed_output_budget([items[i] for i in packed])
+                response = self._generate(prompt, max_output_tokens)
+                optimized = self._parse_packed_response(response['text'])
+                usage = self._usage(response, max_output_tokens)
+                usage['shared_by'] = len(packed)  # uso da requisição inteira, dividida entre os itens
+                served_by = response.get('served_by', response['model'])
+                finish_reason = response['finish_reason']
+            except Exception as e:
+                logger.warning(f"Falha na requisição empacotada, otimizando itens individualmente: {str(e)}")
+                optimized = {}
+            
+            for position, i in enumerate(packed):
+                if position not in optimized:
+                    continue
+                item = items[i]
+                platform = item.get('platform', 'instagram')
+                # Como em optimize_post, uma resposta ainda truncada não vai para o cache
+                if self.cache and finish_reason != 'MAX_TOKENS':
+                    self.cache.set(self._item_cache_key(item), optimized[position])
+                results[i] = self._build_result(
+                    item['description'], optimized[position], platform, usage=usage, served_by=served_by,
+                    finish_reason=finish_reason, context=item.get('context', '')
+                )
+        
+        elapsed = time.perf_counter() - start
+        for result, prescore in zip(results, prescores):
+            if result is not None and result.get('fast_path') is None:
+                if prescore:
+                    result['fast_path'] = prescore
+                self._record_post(result, elapsed)
+        
+        # Itens que não vieram na resposta empacotada são refeitos um a um; o cache
+        # já foi consultado acima, então a nova geração apenas o atualiza
+        missing = [i for i, result in enumerate(results) if result is None]
+        if len(packed) > 1 and missing:
+            logger.warning(f"{len(missing)} itens não foram interpretados na resposta empacotada")
+        for i in missing:
+            results[i] = self._optimize_batch_item(items[i], refresh_cache=True)
+        
+        return results
+    
+    def _render_packed_prompt(self, items: list) -> str:
+        """Monta o prompt de uma requisição empacotada"""
+        platforms = list(dict.fromkeys(item.get('platform', 'instagram') for item in items))
+        guidelines = "\n\n".join(
+            f"### {platform}\n{self._platform_guidelines(platform)}" for platform in platforms
+        )
+        
+        payload = []
+        for position, item in enumerate(items):
+            entry = {
+                'id': position,
+                'platform': item.get('platform', 'instagram'),
+                'description': item['description']
             }
+            if item.get('context'):
+                entry['context'] = item['context']
+            payload.append(entry)
+        
+        return compile_template(Config.PACKED_PROMPT).format(
+            platform_guidelines=guidelines,
+            items=json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+        )
     
-    def _calculate_metrics(self, original: str, optimized: str) -> dict:
-        """Calcula métricas básicas para comparar as descrições"""
+    def _platform_guidelines(self, platform: str) -> str:
+        """Instruções da plataforma, sem a parte específica de cada post"""
+        return compiled_prompt(platform).split("Descrição original:")[0].strip()
+    
+    def _parse_packed_response(self, text: str) -> dict:
+        """Extrai {id: descrição otimizada} da resposta JSON do modelo"""
+        # Remover cercas de código markdown que o modelo às vezes adiciona
+        text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+        start, end = text.find('['), text.rfind(']')
+        if start == -1 or end == -1:
+            raise ValueError("Resposta empacotada sem array JSON")
+        
+        optimized = {}
+        for entry in json.loads(text[start:end + 1]):
+            if not isinstance(entry, dict):
+                continue
+            description = entry.get('optimized_description')
+            if isinstance(entry.get('id'), int) and isinstance(description, str) and description.strip():
+                optimized[entry['id']] = description.strip()
+        
+        return optimized
+    
+    def _build_result(self, original_description: str, optimized_description: str,
+                      platform: str, cached: bool = False, usage: dict = None,
+                      served_by: str = None, finish_reason: str = None, context: str = "") -> dict:
+        """Monta o dicionário de resultado com métricas e sugestões"""
+        # Calcular métricas básicas
+        metrics = self._calculate_metrics(original_description, optimized_description)
+        
         return {
-            'original_length': len(original),
-            'optimized_length': len(optimized),
-            'length_change': len(optimized) - len(original),
-            'hashtag_count': optimized.count('#'),
-            'emoji_count': sum(1 for char in optimized if ord(char) > 127),
-            'question_count': optimized.count('?'),
-            'exclamation_count': optimized.count('!')
+            'success': True,
+            'original_description': original_description,
+            'optimized_description': optimized_description,
+            'platform': platform,
+            'context': context,
+            'metrics': metrics,
+            'suggestions': self._generate_suggestions(optimized_description, platform, metrics),
+            'cached': cached,
+            'usage': usage,
+            'served_by': served_by,
+            'finish_reason': finish_reason
         }
     
-    def _generate_suggestions(self, description: str, platform: str) -> list:
-        """Gera sugestões adicionais para melhorar o engajamento"""
-        suggestions = []
-        
-        if platform == 'instagram':
-            if description.count('#') < 3:
-                suggestions.append("Considere adicionar mais hashtags relevantes")
-            if description.count('?') == 0:
-                suggestions.append("Adicione uma pergunta para gerar mais comentários")
-            if description.count('!') == 0:
-                suggestions.append("Use exclamações para criar mais entusiasmo")
+    @staticmethod
+    def _error_result(original_description: str, error: Exception) -> dict:
+        result = {
+            'success': False,
+            'error': str(error),
+            'original_description': original_description
+        }
+        if isinstance(error, (BlockedResponseError, EmptyResponseError)):
+            result['finish_reason'] = error.finish_reason
+        return result
+    
+    def _estimate_tokens(self, prompt: str, max_output_tokens: int = None) -> int:
+        """Estimativa conservadora de tokens (entrada + saída máxima) para o limitador TPM"""
+        return len(prompt) // 4 + (max_output_tokens or Config.MAX_TOKENS)
+    
+    def _calculate_metrics(self, original: str, optimized: str) -> dict:
+        """Calcula métricas básicas para comparar as descrições (uma única passagem pelo texto)"""
+        return calculate_metrics(original, optimized)
+    
+    def _generate_suggestions(self, description: str, platform: str, metrics: dict = None) -> list:
+        """Gera sugestões adicionais para melhorar o engajamento (regras não atendidas)"""
+        # Reaproveitar as métricas já calculadas evita percorrer o texto de novo
+        return self.rules.suggestions(description, platform, metrics)
+    
+    def _prescore(self, description: str, platform: str) -> dict:
+        """
+        Avalia a descrição original pelas regras antes de chamar o modelo
         
-        elif platform == 'linkedin':
-            if len(description) < 100:
-                suggestions.append("Posts mais longos tendem a ter melhor engajamento no LinkedIn")
-            if description.count('?') == 0:
-                suggestions.append("Termine com uma pergunta para gerar discussão")
+        Returns:
+            dict: 'decision' ('skip', 'template' ou 'model'), 'score' e 'failed',
+                ou None com o atalho desativado ou sem regras para a plataforma
+        """
+        if self.fast_path == 'off':
+            return None
+        evaluation = self.rules.evaluate(description, platform)
+        if evaluation is None:
+            return None
         
-        elif platform == 'twitter':
-            if len(description) > 200:
-                suggestions.append("Considere dividir em threads para posts mais longos")
-            if description.count('#') < 2:
-                suggestions.append("Adicione hashtags relevantes para aumentar a visibilidade")
+        compliant = evaluation['score'] >= Config.FAST_PATH_THRESHOLD
+        return {
+            'decision': self.fast_path if compliant else 'model',
+            'score': evaluation['score'],
+            'failed': evaluation['failed']
+        }
+    
+    def _fast_path_result(self, description: str, platform: str, prescore: dict, start: float,
+                          context: str = "") -> dict:
+        """Resultado de um post que já atende às regras, sem chamar o modelo"""
+        optimized = rewrite(description, platform) if prescore['decision'] == 'template' else description
+        result = self._build_result(description, optimized, platform, served_by='rules', context=context)
+        result['fast_path'] = prescore
         
-        return suggestions
+        self.instrumentation.increment(f"fast_path_{prescore['decision']}_total")
+        self.instrumentation.emit('fast_path', decision=prescore['decision'], score=prescore['score'])
+        self._record_post(result, time.perf_counter() - start)
+        return result
     
-    def batch_optimize(self, posts: list) -> list:
+    def batch_optimize(self, posts: list, refresh_cache: bool = False, pack_size: int = 1) -> list:
         """
         Otimiza múltiplos posts de uma vez
         
         Args:
-            posts: Lista de dicionários com 'description', 'platform' e 'context'
+            posts: Lista de dicionários com 'description', 'platform' (ou uma lista
+                em 'platforms') e 'context'
+            refresh_cache: Ignora respostas em cache e grava as novas gerações
+            pack_size: Número de itens por requisição empacotada (1 desativa o empacotamento)
         
         Returns:
-            list: Lista de resultados otimizados
+            list: Lista de resultados otimizados, um por post e plataforma
         """
+        start = time.perf_counter()
+        items = self._expand_posts(posts)
+        unique, plan = self._deduplicate(items)
+        
         results = []
-        for post in posts:
-            result = self.optimize_post(
-                original_description=post['description'],
-                platform=post.get('platform', 'instagram'),
-                additional_context=post.get('context', '')
-            )
-            results.append(result)
+        for pack in self._split_packs(unique, pack_size):
+            if len(pack) > 1:
+                results.extend(self.optimize_packed(pack, refresh_cache))
+            else:
+                results.append(self._optimize_batch_item(pack[0], refresh_cache))
+        
+        results = self._fan_out(items, plan, results)
+        self._record_batch(len(results), time.perf_counter() - start)
+        return results
+    
+    async def abatch_optimize(self, posts: list, concurrency: int = None,
+                              refresh_cache: bool = False, pack_size: int = 1) -> list:
+        """
+        Otimiza múltiplos posts de forma concorrente
+        
+        Mantém até `concurrency` requisições em andamento, todas cadenciadas pelo
+        mesmo limitador de taxa.
+        
+        Args:
+            posts: Lista de dicionários com 'description', 'platform' (ou uma lista
+                em 'platforms') e 'context'
+            concurrency: Número máximo de requisições simultâneas (padrão: Config.CONCURRENCY)
+            refresh_cache: Ignora respostas em cache e grava as novas gerações
+            pack_size: Número de itens por requisição empacotada (1 desativa o empacotamento)
+        
+        Returns:
+            list: Lista de resultados otimizados, na mesma ordem da entrada
+        """
+        import asyncio
+        
+        start = time.perf_counter()
+        concurrency = max(1, concurrency or Config.CONCURRENCY)
+        items = self._expand_posts(posts)
+        unique, plan = self._deduplicate(items)
+        packs = self._split_packs(unique, pack_size)
+        semaphore = asyncio.Semaphore(concurrency)
+        loop = asyncio.get_running_loop()
+        
+        # O SDK do Gemini é bloqueante, então cada requisição roda em uma thread própria
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            async def run(pack):
+                async with semaphore:
+                    return await loop.run_in_executor(
+                        executor, self.optimize_packed, pack, refresh_cache
+                    )
+            
+            # gather preserva a ordem de entrada
+            pack_results = await asyncio.gather(*(run(pack) for pack in packs))
         
-        return results 
\ No newline at end of file
+        results = [result for results in pack_results for result in results]
+        results = self._fan_out(items, plan, results)
+        self._record_batch(len(results), time.perf_counter() - start)
+        return results
+    
+    def _deduplicate(self, items: list):
+        """Retorna os itens que precisam ir ao modelo e o plano de deduplicação (ou None)"""
+        if not self.deduplicator:
+            return items, None
+        return self.deduplicator.plan(items)
+    
+    def _fan_out(self, items: list, plan, unique_results: list) -> list:
+        """Replica os resultados dos itens únicos para os quase duplicados"""
+        if plan is None:
+            return unique_results
+        
+        saved = len(items) - len(unique_results)
+        if saved:
+            self.instrumentation.increment('dedup_calls_saved_total', saved)
+            self.instrumentation.emit('dedup', items=len(items), calls_saved=saved)
+        results = self.deduplicator.fan_out(items, plan, unique_results, self._build_result)
+        # Os itens únicos já foram gravados por _record_post; faltam os duplicados
+        self._save_history([result for result, (kind, _, _) in zip(results, plan) if kind != 'new'])
+        return results
+    
+    def _record_batch(self, size: int, elapsed: float):
+        self.instrumentation.observe('batch_seconds', elapsed)
+        self.instrumentation.increment('batches_total')
+        self.instrumentation.emit('batch', size=size, elapsed=elapsed)
+    
+    def iter_optimize(self, items, concurrency: int = 1, refresh_cache: bool = False):
+        """
+        Pipeline em streaming: consome posts sob demanda e produz resultados conforme ficam prontos
+        
+        Mantém no máximo `concurrency` posts em memória/andamento, então o consumo
+        de memória não cresce com o tamanho da entrada. Como em batch_optimize,
+        um post com uma lista em 'platforms' gera um resultado por plataforma.
+        
+        Args:
+            items: Iterável de tuplas (índice, post)
+            concurrency: Número máximo de requisições simultâneas
+            refresh_cache: Ignora respostas em cache e grava as novas gerações
+        
+        Yields:
+            tuple: (índice do post, resultado), na ordem em que terminam
+        """
+        concurrency = max(1, concurrency)
+        items = ((index, item) for index, post in items for item in self._expand_post(post))
+        if concurrency == 1:
+            for index, post in items:
+                yield index, self._optimize_batch_item(post, refresh_cache)
+            return
+        
+        items = iter(items)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = {}
+            exhausted = False
+            while pending or not exhausted:
+                # Completar a janela de requisições em andamento
+                while not exhausted and len(pending) < concurrency:
+                    try:
+                        index, post = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    future = executor.submit(self._optimize_batch_item, post, refresh_cache)
+                    pending[future] = index
+                
+                if not pending:
+                    break
+                
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+    
+    def _expand_posts(self, posts: list) -> list:
+        """Gera um item por combinação de post e plataforma de destino"""
+        return [item for post in posts for item in self._expand_post(post)]
+    
+    @staticmethod
+    def _expand_post(post: dict) -> list:
+        """Itens de um post, um por plataforma de destino"""
+        platforms = post.get('platforms') or [post.get('platform', 'instagram')]
+        return [
+            {
+                'description': post['description'],
+                'platform': platform,
+                'context': post.get('context', '')
+            }
+            for platform in platforms
+        ]
+    
+    def _split_packs(self, items: list, pack_size: int) -> list:
+        """Divide os itens em grupos de até pack_size para requisições empacotadas"""
+        pack_size = max(1, pack_size)
+        return [items[start:start + pack_size] for start in range(0, len(items), pack_size)]
+    
+    def _optimize_batch_item(self, post: dict, refresh_cache: bool = False) -> dict:
+        """Otimiza um item de lote no formato {'description', 'platform', 'context'}"""
+        return self.optimize_post(
+            original_description=post['description'],
+            platform=post.get('platform', 'instagram'),
+            additional_context=post.get('context', ''),
+            refresh_cache=refresh_cache
+        ) 
\ No newline at end of file
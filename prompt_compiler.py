@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Compilação de prompts e orçamento de tokens de saída
+
+Os templates de Config.PROMPTS são escritos com indentação e linhas em branco
+para facilitar a leitura no código; compile_template remove esse espaço uma
+única vez por template. output_budget escolhe o max_output_tokens de cada
+requisição pela plataforma e pelo tamanho da entrada.
+
+Executado diretamente, compara o tamanho dos templates originais e compilados.
+"""
+
+import functools
+import textwrap
+
+from backends import estimate_tokens
+from config import Config
+
+# Espaço médio de tokens de saída por item no JSON de uma resposta empacotada
+PACKED_ITEM_OVERHEAD = 20
+
+
+@functools.lru_cache(maxsize=None)
+def compile_template(template: str) -> str:
+    """
+    Remove indentação, espaços no fim das linhas e linhas em branco de um template
+
+    O resultado fica em cache pelo próprio texto do template, então alterações
+    em Config.PROMPTS em tempo de execução são compiladas de novo.
+    """
+    lines = (line.strip() for line in textwrap.dedent(template).strip().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def compiled_prompt(platform: str) -> str:
+    return compile_template(Config.PROMPTS[platform])
+
+
+def output_budget(platform: str, description: str, context: str = "") -> int:
+    """
+    Limite de tokens de saída de uma requisição individual
+
+    Parte do mínimo da plataforma e cresce com o tamanho da entrada até o
+    máximo da plataforma, nunca passando de Config.MAX_TOKENS. Com
+    Config.TOKEN_BUDGETS desativado, retorna Config.MAX_TOKENS.
+    """
+    budget = Config.OUTPUT_TOKEN_BUDGETS.get(platform)
+    if not Config.TOKEN_BUDGETS or budget is None:
+        return Config.MAX_TOKENS
+
+    minimum, maximum = budget
+    input_tokens = estimate_tokens(description) + estimate_tokens(context)
+    return min(Config.MAX_TOKENS, maximum, minimum + 3 * input_tokens)
+
+
+def packed_output_budget(items: list) -> int:
+    """Limite de tokens de saída de uma requisição empacotada: a soma dos itens mais o JSON"""
+    total = sum(
+        output_budget(item.get('platform', 'instagram'), item['description'], item.get('context', ''))
+        + PACKED_ITEM_OVERHEAD
+        for item in items
+    )
+    return min(Config.PACKED_MAX_TOKENS, total)
+
+
+def template_report() -> dict:
+    """Tokens estimados de cada template antes e depois da compilação"""
+    report = {}
+    templates = dict(Config.PROMPTS, packed=Config.PACKED_PROMPT)
+    for name, template in templates.items():
+        original = estimate_tokens(template)
+        compiled = estimate_tokens(compile_template(template))
+        report[name] = {
+            'original_tokens': original,
+            'compiled_tokens': compiled,
+            'saved_tokens': original - compiled
+        }
+    return report
+
+
+def main():
+    print("📐 Templates (tokens estimados por requisição):")
+    for name, entry in template_report().items():
+        print(f"   - {name}: {entry['original_tokens']} → {entry['compiled_tokens']} "
+              f"({entry['saved_tokens']} a menos)")
+
+    print("🎯 Orçamento de saída (descrição curta → longa):")
+    short, long = "x" * 80, "x" * 1200
+    for platform in Config.PROMPTS:
+        print(f"   - {platform}: {output_budget(platform, short)} → {output_budget(platform, long)} "
+              f"tokens (antes: {Config.MAX_TOKENS})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """
+    Limitador de taxa por janela deslizante compartilhado entre threads
+
+    Controla dois orçamentos independentes: requisições por minuto (RPM) e
+    tokens por minuto (TPM). Um valor 0 ou None desativa o respectivo limite.
+
+    Cada reserva recebe um horário de envio tal que nenhuma janela de
+    WINDOW segundos contenha mais que o RPM/TPM configurado, nem mesmo no
+    primeiro minuto (um token bucket cheio que ainda se reabastece deixaria
+    passar quase o dobro).
+    """
+
+    # Duração, em segundos, da janela à qual os limites se aplicam
+    WINDOW = 60.0
+
+    # Relógio das reservas; subclasses compartilhadas entre processos usam o relógio de parede
+    _clock = staticmethod(time.monotonic)
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.requests_per_minute = requests_per_minute or 0
+        self.tokens_per_minute = tokens_per_minute or 0
+        self._lock = threading.Lock()
+
+        # Reservas (horário de envio, tokens) da última janela, em ordem de horário;
+        # horários no futuro são de chamadores que ainda estão aguardando
+        self._reservations = deque()
+
+    def _slot(self, tokens: int, now: float) -> float:
+        """Primeiro horário, a partir de agora, em que a reserva cabe na janela"""
+        # Reservas saem na ordem de chegada, então os horários na fila ficam ordenados
+        slot = max(now, self._reservations[-1][0]) if self._reservations else now
+
+        limit = max(1, int(self.requests_per_minute))
+        if self.requests_per_minute and len(self._reservations) >= limit:
+            # A janela que termina no novo envio não pode conter a reserva RPM-ésima mais recente
+            slot = max(slot, self._reservations[-limit][0] + self.WINDOW)
+
+        if self.tokens_per_minute and tokens:
+            budget = self.tokens_per_minute - tokens
+            for sent_at, used in reversed(self._reservations):
+                budget -= used
+                if budget < 0:
+                    slot = max(slot, sent_at + self.WINDOW)
+                    break
+        return slot
+
+    def _reserve(self, tokens: int, only_if_available: bool = False) -> float:
+        """
+        Reserva capacidade para uma requisição
+
+        Args:
+            tokens: Tokens estimados da requisição
+            only_if_available: Só reserva se houver capacidade agora, sem criar espera
+
+        Returns:
+            float: Segundos que o chamador deve aguardar antes de enviar a requisição,
+                ou None se only_if_available e não houver capacidade
+        """
+        # Uma requisição maior que o limite nunca caberia; limita ao tamanho do limite
+        tokens = min(tokens or 0, self.tokens_per_minute) if self.tokens_per_minute else 0
+
+        with self._lock:
+            now = self._clock()
+            while self._reservations and self._reservations[0][0] <= now - self.WINDOW:
+                self._reservations.popleft()
+
+            slot = self._slot(tokens, now)
+            if only_if_available and slot > now:
+                return None
+            if self.requests_per_minute or tokens:
+                self._reservations.append((slot, tokens))
+            return slot - now
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Bloqueia a thread atual até haver capacidade; retorna o tempo aguardado"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self, tokens: int = 0) -> bool:
+        """Reserva capacidade apenas se houver folga agora, sem esperar; retorna se conseguiu"""
+        return self._reserve(tokens, only_if_available=True) is not None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.requests_per_minute or self.tokens_per_minute)
+
+
+class FileRateLimiter(RateLimiter):
+    """
+    Limitador compartilhado entre processos (ou máquinas) por um arquivo de estado
+
+    As reservas da última janela ficam em `path` e cada reserva é feita com um lock
+    exclusivo (fcntl) em `path + '.lock'`, então todos os processos que usam o
+    mesmo arquivo dividem o mesmo orçamento de RPM/TPM. Disponível apenas em
+    sistemas POSIX.
+    """
+
+    _clock = staticmethod(time.time)
+
+    def __init__(self, path: str, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        import fcntl  # só existe em sistemas POSIX
+
+        super().__init__(requests_per_minute, tokens_per_minute)
+        self.path = path
+        self._fcntl = fcntl
+
+    def _reserve(self, tokens: int, only_if_available: bool = False) -> float:
+        with open(self.path + '.lock', 'a') as lock_file:
+            self._fcntl.flock(lock_file, self._fcntl.LOCK_EX)
+            try:
+                self._load()
+                wait = super()._reserve(tokens, only_if_available)
+                self._save()
+            finally:
+                self._fcntl.flock(lock_file, self._fcntl.LOCK_UN)
+        return wait
+
+    def _load(self):
+        """Lê as reservas gravadas pelos outros processos (nenhuma se o arquivo ainda não existir)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self._reservations = deque(tuple(entry) for entry in state.get('reservations', ()))
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'reservations': list(self._reservations)}, f)
+        os.replace(tmp_path, self.path)
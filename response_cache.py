@@ -0,0 +1,129 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    Cache persistente (SQLite) das respostas do modelo
+
+    A chave é um hash do conteúdo da requisição (modelo, plataforma, prompt
+    renderizado e parâmetros de geração), então prompts idênticos reaproveitam
+    a mesma resposta. Entradas são removidas por idade (TTL) e por tamanho (LRU).
+
+    A remoção não roda a cada gravação: roda a cada EVICT_INTERVAL segundos ou
+    quando as gravações desde a última remoção passam de 5% de max_entries, então
+    o cache pode exceder max_entries por pouco tempo. Entradas expiradas nunca
+    são retornadas, mesmo antes de removidas.
+    """
+
+    # Intervalo máximo, em segundos, entre duas remoções por TTL/LRU
+    EVICT_INTERVAL = 60.0
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl: float = 0):
+        """
+        Args:
+            path: Caminho do arquivo SQLite (':memory:' para cache só em memória)
+            max_entries: Número máximo de entradas, 0 desativa o limite
+            ttl: Idade máxima das entradas em segundos, 0 desativa a expiração
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._evicted_at = 0.0
+        self._writes = 0
+
+        self._lock = threading.Lock()
+        # timeout e WAL: threads e processos (por exemplo, --shards) dividem o mesmo arquivo
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        if path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_created ON responses (created_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, platform: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        """Gera a chave de cache a partir de tudo que influencia a resposta"""
+        payload = json.dumps(
+            [model, platform, prompt, temperature, max_tokens],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """Retorna a resposta em cache ou None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row and self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, response: str):
+        """Armazena uma resposta e aplica a política de remoção"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            self._writes += 1
+            overflow = self.max_entries and self._writes > self.max_entries // 20
+            if overflow or now - self._evicted_at >= self.EVICT_INTERVAL:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """Remove entradas expiradas e, se necessário, as menos usadas recentemente (chamado com o lock)"""
+        self._evicted_at = now
+        self._writes = 0
+        if self.ttl:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+
+        if self.max_entries:
+            self._conn.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def clear(self):
+        """Remove todas as entradas do cache"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """Contadores de acertos/falhas desde a criação do cache"""
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
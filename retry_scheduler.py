@@ -0,0 +1,174 @@
+import logging
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Formatos em que a API informa quanto tempo esperar antes de tentar de novo
+RETRY_DELAY_PATTERNS = [
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*([\d.]+)"),
+    re.compile(r"retry in\s*([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry-after:?\s*([\d.]+)", re.IGNORECASE),
+]
+
+
+class QuotaExhaustedError(Exception):
+    """A quota diária foi esgotada e o circuito está aberto"""
+
+
+class RetryScheduler:
+    """
+    Agendador central de retries com backoff coordenado entre chamadores
+
+    Um erro 429 pausa todas as requisições que compartilham o agendador (e não
+    só a que falhou), usando o tempo de espera informado pela API quando houver.
+    Ao esgotar a quota diária, o circuito é aberto: dependendo da política, os
+    chamadores falham imediatamente ('fail') ou ficam estacionados até o
+    circuito fechar ('wait').
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 6.0, max_delay: float = 60.0,
+                 daily_cooldown: float = 3600.0, daily_policy: str = 'fail'):
+        """
+        Args:
+            max_retries: Número máximo de tentativas por chamada
+            base_delay: Espera base quando a API não informa o tempo de espera
+            max_delay: Espera máxima de um backoff exponencial
+            daily_cooldown: Tempo que o circuito fica aberto após esgotar a quota diária
+            daily_policy: 'fail' (falha imediata) ou 'wait' (aguarda o circuito fechar)
+        """
+        if daily_policy not in ('fail', 'wait'):
+            raise ValueError(f"Política de quota diária inválida: {daily_policy}. Use: fail, wait")
+
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.daily_cooldown = daily_cooldown
+        self.daily_policy = daily_policy
+
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._circuit_open_until = 0.0
+        self.stats = {
+            'retries': 0,
+            'backoff_seconds': 0.0,
+            'rate_limited': 0,
+            'circuit_opened': 0
+        }
+
+    def run(self, operation, listener=None):
+        """
+        Executa operation() com retry coordenado
+
+        Args:
+            operation: Função sem argumentos que faz a requisição
+            listener: Opcional, chamado como listener('retry', tipo) a cada nova
+                tentativa e listener('backoff', segundos) a cada espera
+
+        Returns:
+            O retorno de operation()
+
+        Raises:
+            QuotaExhaustedError: Quota diária esgotada com a política 'fail'
+            Exception: O último erro, se não for de quota ou se as tentativas acabarem
+        """
+        for attempt in range(self.max_retries):
+            waited = self.wait_turn()
+            if waited and listener:
+                listener('backoff', waited)
+            try:
+                return operation()
+            except Exception as e:
+                kind = self.classify(e)
+                if kind is None:
+                    raise
+
+                retry_delay = self.parse_retry_delay(e)
+                with self._lock:
+                    self.stats['rate_limited'] += 1
+
+                if kind == 'daily':
+                    self._open_circuit(retry_delay)
+                    if self.daily_policy == 'fail':
+                        raise QuotaExhaustedError(f"Quota diária esgotada: {str(e)}") from e
+                else:
+                    self._pause(retry_delay if retry_delay is not None else self._backoff(kind, attempt))
+
+                if attempt == self.max_retries - 1:
+                    raise
+
+                with self._lock:
+                    self.stats['retries'] += 1
+                if listener:
+                    listener('retry', kind)
+                logger.warning(f"Limite de quota atingido. Nova tentativa {attempt + 2} de {self.max_retries}...")
+
+    def wait_turn(self) -> float:
+        """
+        Aguarda o fim de uma pausa global ou do circuito aberto antes de enviar uma requisição
+
+        Returns:
+            float: Segundos aguardados
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._circuit_open_until and self.daily_policy == 'fail':
+                    raise QuotaExhaustedError("Quota diária esgotada; circuito aberto")
+                wait = max(self._paused_until, self._circuit_open_until) - now
+                if wait <= 0:
+                    return waited
+                self.stats['backoff_seconds'] += wait
+            time.sleep(wait)
+            waited += wait
+
+    @staticmethod
+    def classify(error: Exception):
+        """Retorna 'minute', 'daily' ou 'quota' para erros 429, e None para os demais"""
+        message = str(error)
+        if "429" not in message and "ResourceExhausted" not in type(error).__name__:
+            return None
+        if "GenerateRequestsPerDay" in message:
+            return 'daily'
+        if "GenerateRequestsPerMinute" in message:
+            return 'minute'
+        return 'quota'
+
+    @staticmethod
+    def parse_retry_delay(error: Exception):
+        """Extrai o tempo de espera sugerido pela API, em segundos, ou None"""
+        retry_delay = getattr(error, 'retry_delay', None)
+        if isinstance(retry_delay, (int, float)):
+            return float(retry_delay)
+
+        message = str(error)
+        for pattern in RETRY_DELAY_PATTERNS:
+            match = pattern.search(message)
+            if match:
+                return float(match.group(1))
+        return None
+
+    def _backoff(self, kind: str, attempt: int) -> float:
+        """Backoff exponencial com jitter, usado quando a API não sugere uma espera"""
+        base = self.base_delay if kind == 'minute' else self.base_delay * 2
+        return min(self.max_delay, base * (2 ** attempt)) + random.uniform(0, self.base_delay / 2)
+
+    def _pause(self, delay: float):
+        """Pausa todas as requisições até now + delay"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        logger.warning(f"Pausando requisições por {delay:.1f} segundos")
+
+    def _open_circuit(self, retry_delay):
+        cooldown = retry_delay if retry_delay is not None else self.daily_cooldown
+        with self._lock:
+            self._circuit_open_until = max(self._circuit_open_until, time.monotonic() + cooldown)
+            self.stats['circuit_opened'] += 1
+        logger.error(f"Quota diária esgotada. Circuito aberto por {cooldown:.0f} segundos")
+
+    @property
+    def circuit_open(self) -> bool:
+        return time.monotonic() < self._circuit_open_until
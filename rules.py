@@ -0,0 +1,136 @@
+import json
+import logging
+import re
+
+from config import Config
+from metrics import text_metrics
+
+logger = logging.getLogger(__name__)
+
+# Métricas de metrics.text_metrics que as regras podem usar
+RULE_METRICS = ('length', 'hashtag_count', 'emoji_count', 'question_count', 'exclamation_count')
+
+_HASHTAG_PATTERN = re.compile(r"(?<!\w)#\w+")
+_TRAILING_HASHTAGS_PATTERN = re.compile(r"(?:\s*(?<!\w)#\w+)+\s*$")
+_SPACES_PATTERN = re.compile(r"[ \t]+")
+_BLANK_LINES_PATTERN = re.compile(r"\n\s*\n+")
+
+
+class RuleSet:
+    """
+    Regras de engajamento por plataforma
+
+    Cada regra exige um mínimo ('min') e/ou um máximo ('max') de uma métrica do
+    texto e tem um peso ('weight', padrão 1). O score de um texto é a fração do
+    peso das regras atendidas; as regras não atendidas viram sugestões.
+    """
+
+    def __init__(self, rules: dict = None):
+        """
+        Args:
+            rules: Dicionário plataforma -> lista de regras (padrão: Config.PLATFORM_RULES)
+        """
+        rules = Config.PLATFORM_RULES if rules is None else rules
+        self.rules = {platform: [self._validate(rule) for rule in entries] for platform, entries in rules.items()}
+
+    @classmethod
+    def from_config(cls):
+        """Regras padrão acrescidas das regras do arquivo JSON em Config.RULES_PATH"""
+        rules = {platform: list(entries) for platform, entries in Config.PLATFORM_RULES.items()}
+        if Config.RULES_PATH:
+            with open(Config.RULES_PATH, 'r', encoding='utf-8') as f:
+                cls.merge(rules, json.load(f))
+            logger.info(f"Regras carregadas de {Config.RULES_PATH}")
+        return cls(rules)
+
+    @staticmethod
+    def merge(rules: dict, extra: dict):
+        """
+        Acrescenta regras extras; uma regra com a mesma métrica e os mesmos limites
+        ('min'/'max') de uma existente a substitui (use weight 0 para desativá-la)
+        """
+        for platform, entries in extra.items():
+            current = rules.setdefault(platform, [])
+            for rule in entries:
+                kind = (rule.get('metric'), 'min' in rule, 'max' in rule)
+                current[:] = [
+                    existing for existing in current
+                    if (existing['metric'], 'min' in existing, 'max' in existing) != kind
+                ]
+                current.append(rule)
+
+    @staticmethod
+    def _validate(rule: dict) -> dict:
+        if rule.get('metric') not in RULE_METRICS:
+            raise ValueError(f"Métrica de regra inválida: {rule.get('metric')}. Use: {', '.join(RULE_METRICS)}")
+        if 'min' not in rule and 'max' not in rule:
+            raise ValueError(f"A regra de {rule['metric']} precisa de 'min' e/ou 'max'")
+        return rule
+
+    @staticmethod
+    def _passes(rule: dict, metrics: dict) -> bool:
+        value = metrics[rule['metric']]
+        return rule.get('min', value) <= value <= rule.get('max', value)
+
+    def evaluate(self, description: str, platform: str, metrics: dict = None) -> dict:
+        """
+        Avalia um texto pelas regras da plataforma
+
+        Returns:
+            dict: 'score' (0 a 1), 'failed' (métricas das regras não atendidas) e
+                'suggestions', ou None se a plataforma não tiver regras
+        """
+        rules = self.rules.get(platform)
+        if not rules:
+            return None
+
+        metrics = metrics or text_metrics(description)
+        if 'length' not in metrics:
+            # As métricas de calculate_metrics trazem o tamanho como 'optimized_length'
+            metrics = dict(metrics, length=len(description))
+        total = passed = 0.0
+        failed = []
+        suggestions = []
+        for rule in rules:
+            weight = rule.get('weight', 1)
+            total += weight
+            if self._passes(rule, metrics):
+                passed += weight
+            elif weight:
+                failed.append(rule['metric'])
+                if rule.get('suggestion'):
+                    suggestions.append(rule['suggestion'])
+
+        return {
+            'score': round(passed / total, 3) if total else 1.0,
+            'failed': failed,
+            'suggestions': suggestions
+        }
+
+    def suggestions(self, description: str, platform: str, metrics: dict = None) -> list:
+        evaluation = self.evaluate(description, platform, metrics)
+        return evaluation['suggestions'] if evaluation else []
+
+
+def rewrite(description: str, platform: str) -> str:
+    """
+    Reescrita local e barata de um post que já atende às regras
+
+    Normaliza espaços e linhas em branco e move as hashtags finais (sem
+    repetições) para a posição do template da plataforma em
+    Config.FAST_PATH_TEMPLATES.
+    """
+    text = _SPACES_PATTERN.sub(' ', description.strip())
+    text = _BLANK_LINES_PATTERN.sub('\n\n', text)
+
+    trailing = _TRAILING_HASHTAGS_PATTERN.search(text)
+    body = text[:trailing.start()].rstrip() if trailing else text
+    hashtags = []
+    seen = set()
+    for hashtag in _HASHTAG_PATTERN.findall(trailing.group(0) if trailing else ''):
+        if hashtag.lower() not in seen:
+            seen.add(hashtag.lower())
+            hashtags.append(hashtag)
+
+    template = Config.FAST_PATH_TEMPLATES.get(platform, "{body}\n\n{hashtags}")
+    return template.format(body=body, hashtags=' '.join(hashtags)).strip()
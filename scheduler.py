@@ -0,0 +1,306 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from instrumentation import Histogram, Instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Classes de prioridade, da mais urgente para a menos urgente
+PRIORITY_CLASSES = ('interactive', 'default', 'bulk')
+
+# O que fazer com um job que não termina mais dentro do prazo
+DEADLINE_POLICIES = ('drop', 'downgrade')
+
+DEFAULT_TENANT = 'default'
+
+
+class QueueFullError(Exception):
+    """A fila do agendador está cheia (ou o job foi descartado para dar lugar a um mais urgente)"""
+
+
+class DeadlineExceededError(Exception):
+    """O job não pode mais terminar dentro do prazo"""
+
+
+def parse_weights(text: str) -> dict:
+    """Converte 'projeto:peso' separados por vírgula (ex.: 'app:3,backfill:1') em um dicionário"""
+    weights = {}
+    for entry in (text or '').split(','):
+        if not entry.strip():
+            continue
+        tenant, _, weight = entry.rpartition(':')
+        if not tenant.strip():
+            raise ValueError(f"Peso de tenant inválido: {entry.strip()}. Use o formato projeto:peso")
+        weights[tenant.strip()] = float(weight)
+    return weights
+
+
+class Job:
+    """Um item na fila do agendador, resolvido pelo Future `future`"""
+
+    def __init__(self, payload, priority: str, tenant: str, deadline: float = None,
+                 on_deadline: str = 'drop'):
+        self.payload = payload
+        self.priority = priority
+        self.tenant = tenant
+        self.deadline = deadline
+        self.on_deadline = on_deadline
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class _PriorityClass:
+    """Fila de uma classe de prioridade, com uma fila por tenant e tempo virtual para a partilha justa"""
+
+    def __init__(self):
+        self.queues = {}
+        self.virtual = {}
+        self.clock = 0.0
+        self.size = 0
+
+    def push(self, job: Job):
+        queue = self.queues.get(job.tenant)
+        if queue is None:
+            queue = self.queues[job.tenant] = deque()
+            # Um tenant que volta não recupera o tempo em que ficou sem jobs
+            self.virtual[job.tenant] = max(self.virtual.get(job.tenant, 0.0), self.clock)
+        queue.append(job)
+        self.size += 1
+
+    def pop(self, weights: dict) -> Job:
+        """Job do tenant que recebeu menos serviço, ponderado pelo peso"""
+        tenant = min(self.queues, key=lambda name: self.virtual[name])
+        queue = self.queues[tenant]
+        job = queue.popleft()
+        self.size -= 1
+        self.clock = self.virtual[tenant]
+        self.virtual[tenant] += 1.0 / weights.get(tenant, 1.0)
+        if not queue:
+            del self.queues[tenant]
+            if len(self.virtual) > 2 * len(self.queues) + 64:
+                # Tenants inativos já atrás do relógio voltariam ao relógio de qualquer forma
+                self.virtual = {
+                    name: value for name, value in self.virtual.items()
+                    if name in self.queues or value > self.clock
+                }
+        return job
+
+    def evict(self) -> Job:
+        """Job mais recente do tenant que mais recebeu serviço (descartado quando a fila enche)"""
+        tenant = max(self.queues, key=lambda name: self.virtual[name])
+        queue = self.queues[tenant]
+        job = queue.pop()
+        self.size -= 1
+        if not queue:
+            del self.queues[tenant]
+        return job
+
+
+class JobScheduler:
+    """
+    Fila com classes de prioridade, prazos e partilha justa entre tenants
+
+    Os jobs saem em ordem estrita de classe (PRIORITY_CLASSES): os de 'bulk'
+    só usam a capacidade que sobra dos mais urgentes. Dentro de uma classe,
+    os tenants (projetos) se alternam na proporção de seus pesos, então um
+    backfill grande de um tenant não bloqueia os demais. Com a fila cheia, um
+    job mais urgente toma o lugar do job mais recente da classe mais baixa.
+
+    Um job com prazo que não terminaria a tempo (pela média móvel do tempo de
+    serviço) é descartado com DeadlineExceededError ou, com on_deadline
+    'downgrade', rebaixado para a classe seguinte, sem prazo.
+    """
+
+    # Peso da última observação na média móvel exponencial do tempo de serviço
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, capacity: int = 100, weights: dict = None, instrumentation: Instrumentation = None):
+        """
+        Args:
+            capacity: Número máximo de jobs aguardando, somando todas as classes
+            weights: Dicionário tenant -> peso (padrão 1 para tenants ausentes)
+            instrumentation: Opcional, recebe os contadores scheduler_*_total e os
+                histogramas scheduler_wait_seconds_<classe>
+        """
+        self.capacity = max(1, capacity)
+        self.weights = dict(weights or {})
+        self.instrumentation = instrumentation or Instrumentation(prefix='scheduler')
+        self.service_estimate = None
+
+        self._cond = threading.Condition()
+        self._closed = False
+        self._classes = {priority: _PriorityClass() for priority in PRIORITY_CLASSES}
+        self._waits = {priority: Histogram() for priority in PRIORITY_CLASSES}
+        self.stats = {
+            'submitted': 0,
+            'dispatched': 0,
+            'rejected': 0,
+            'shed': 0,
+            'dropped': 0,
+            'downgraded': 0
+        }
+
+    def submit(self, payload, priority: str = 'default', tenant: str = None,
+               deadline: float = None, on_deadline: str = 'drop') -> Job:
+        """
+        Enfileira um job
+
+        Args:
+            payload: Dados do job, devolvidos por next() em job.payload
+            priority: Classe de prioridade (PRIORITY_CLASSES)
+            tenant: Tenant/projeto para a partilha justa (padrão: 'default')
+            deadline: Prazo em segundos a partir de agora (None: sem prazo)
+            on_deadline: 'drop' ou 'downgrade'
+
+        Returns:
+            Job: Com o Future a ser resolvido por quem processar o job
+
+        Raises:
+            QueueFullError: Fila cheia sem job menos urgente para descartar
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Prioridade inválida: {priority}. Use: {', '.join(PRIORITY_CLASSES)}")
+        if on_deadline not in DEADLINE_POLICIES:
+            raise ValueError(f"Política de prazo inválida: {on_deadline}. Use: {', '.join(DEADLINE_POLICIES)}")
+
+        job = Job(
+            payload, priority, tenant or DEFAULT_TENANT,
+            deadline=time.monotonic() + deadline if deadline is not None else None,
+            on_deadline=on_deadline
+        )
+        victim = None
+        with self._cond:
+            if self._closed:
+                raise QueueFullError("Agendador encerrado")
+            if self._depth() >= self.capacity:
+                victim = self._evict_below(priority)
+                if victim is None:
+                    self.stats['rejected'] += 1
+                    self._increment('scheduler_rejected_total')
+                    raise QueueFullError("Fila de requisições cheia")
+            self._classes[priority].push(job)
+            self.stats['submitted'] += 1
+            self._cond.notify_all()
+
+        if victim is not None:
+            victim.future.set_exception(QueueFullError("Job descartado para dar lugar a um mais urgente"))
+        return job
+
+    def _evict_below(self, priority: str):
+        """Remove o job mais recente da classe mais baixa abaixo de `priority` (chamado com o lock)"""
+        rank = PRIORITY_CLASSES.index(priority)
+        for lower in reversed(PRIORITY_CLASSES[rank + 1:]):
+            if self._classes[lower].size:
+                self.stats['shed'] += 1
+                self._increment('scheduler_shed_total')
+                return self._classes[lower].evict()
+        return None
+
+    def next(self, timeout: float = None, classes: tuple = PRIORITY_CLASSES):
+        """
+        Próximo job, na ordem de prioridade e de partilha justa
+
+        Args:
+            timeout: Espera máxima em segundos (None espera até haver um job ou o agendador fechar)
+            classes: Classes que quem chama aceita (ex.: só 'interactive' para um worker reservado)
+
+        Returns:
+            Job, ou None se o tempo acabar ou o agendador estiver fechado e sem jobs dessas classes
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            expired = []
+            with self._cond:
+                job = self._pop(classes, expired)
+                if job is None and not expired:
+                    if self._closed:
+                        return None
+                    remaining = None if end is None else end - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+                    continue
+
+            for dropped in expired:
+                dropped.future.set_exception(DeadlineExceededError(
+                    f"Prazo esgotado após {time.monotonic() - dropped.enqueued_at:.2f}s na fila"
+                ))
+            if job is not None:
+                return job
+
+    def _pop(self, classes: tuple, expired: list):
+        """Retira o próximo job viável, aplicando as políticas de prazo (chamado com o lock)"""
+        for priority in PRIORITY_CLASSES:
+            if priority not in classes:
+                continue
+            queue = self._classes[priority]
+            while queue.size:
+                job = queue.pop(self.weights)
+                now = time.monotonic()
+                if job.deadline is not None and now + (self.service_estimate or 0.0) > job.deadline:
+                    self._miss_deadline(job, expired)
+                    continue
+
+                wait = now - job.enqueued_at
+                self._waits[priority].observe(wait)
+                self.instrumentation.observe(f'scheduler_wait_seconds_{priority}', wait)
+                self.stats['dispatched'] += 1
+                return job
+        return None
+
+    def _miss_deadline(self, job: Job, expired: list):
+        """Rebaixa ou descarta um job que não termina mais no prazo (chamado com o lock)"""
+        rank = PRIORITY_CLASSES.index(job.priority)
+        if job.on_deadline == 'downgrade' and rank + 1 < len(PRIORITY_CLASSES):
+            job.priority = PRIORITY_CLASSES[rank + 1]
+            job.deadline = None
+            self._classes[job.priority].push(job)
+            self.stats['downgraded'] += 1
+            self._increment('scheduler_downgraded_total')
+            return
+        self.stats['dropped'] += 1
+        self._increment('scheduler_dropped_total')
+        expired.append(job)
+
+    def record_service(self, seconds: float):
+        """Atualiza a média móvel do tempo de serviço de um job, usada nos prazos"""
+        with self._cond:
+            if self.service_estimate is None:
+                self.service_estimate = seconds
+            else:
+                self.service_estimate += self.EWMA_ALPHA * (seconds - self.service_estimate)
+
+    def close(self):
+        """Não aceita novos jobs; next() retorna None quando não houver mais jobs"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _depth(self) -> int:
+        return sum(queue.size for queue in self._classes.values())
+
+    def depth(self, priority: str = None) -> int:
+        """Jobs aguardando, no total ou de uma classe"""
+        with self._cond:
+            return self._classes[priority].size if priority else self._depth()
+
+    def _increment(self, name: str, value: float = 1):
+        self.instrumentation.increment(name, value)
+
+    def scheduler_stats(self) -> dict:
+        """Profundidade da fila por classe e por tenant, contadores, tempo de serviço e esperas"""
+        with self._cond:
+            return {
+                'depth': {priority: queue.size for priority, queue in self._classes.items()},
+                'capacity': self.capacity,
+                'tenants': {
+                    priority: {tenant: len(jobs) for tenant, jobs in queue.queues.items()}
+                    for priority, queue in self._classes.items() if queue.size
+                },
+                'service_estimate': self.service_estimate,
+                'wait_seconds': {priority: histogram.summary() for priority, histogram in self._waits.items()},
+                **self.stats
+            }
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Servidor HTTP do Agente de Otimização de Posts
+
+Mantém um único PostOptimizer aquecido (backend, cache, limitador de taxa e
+agendador de retries) compartilhado por todos os clientes. As requisições
+entram em uma fila limitada com classes de prioridade (JobScheduler), são
+agrupadas em micro-lotes e processadas no ritmo da quota; com a fila cheia o
+servidor responde 429, com a quota diária esgotada ou durante o desligamento,
+503, e quando o prazo da requisição se esgota na fila, 504.
+
+Endpoints:
+    POST /optimize  {"description", "platform", "context", "refresh_cache",
+                     "priority", "tenant", "deadline", "on_deadline"}
+    GET  /health    Estado da fila, do agendador e do circuito de quota
+    GET  /metrics   Métricas no formato texto do Prometheus
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backends import create_backend
+from config import Config
+from post_optimizer import PostOptimizer
+from scheduler import (
+    DEADLINE_POLICIES, PRIORITY_CLASSES, DeadlineExceededError, JobScheduler, QueueFullError, parse_weights
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceOverloadedError(Exception):
+    """A fila de requisições está cheia"""
+
+
+class ServiceUnavailableError(Exception):
+    """O serviço está desligando ou a quota diária está esgotada"""
+
+
+class OptimizationService:
+    """
+    Fila de otimização com micro-lotes sobre um PostOptimizer compartilhado
+
+    As requisições passam por um JobScheduler: saem por classe de prioridade
+    ('interactive' antes de 'default' e 'bulk'), com partilha justa entre
+    tenants dentro de cada classe e prazos por requisição. Cada worker retira
+    até `batch_size` requisições, aguardando no máximo `batch_window` segundos
+    para completar o lote; os primeiros `interactive_workers` workers só
+    atendem a classe 'interactive', então um backfill nunca ocupa todos. Com
+    `pack_size` > 1, os itens do lote são empacotados em requisições únicas ao
+    modelo (optimize_packed); caso contrário, são otimizados um a um. Em ambos
+    os casos o ritmo é ditado pelo limitador de taxa do otimizador.
+    """
+
+    def __init__(self, optimizer: PostOptimizer = None, queue_size: int = 100,
+                 batch_size: int = 8, batch_window: float = 0.05,
+                 workers: int = 2, pack_size: int = 1, interactive_workers: int = 0,
+                 tenant_weights: dict = None, default_priority: str = 'interactive',
+                 deadline_policy: str = 'drop'):
+        """
+        Args:
+            optimizer: Otimizador compartilhado (padrão: criado a partir do Config)
+            queue_size: Número máximo de requisições aguardando na fila
+            batch_size: Número máximo de requisições retiradas da fila de uma vez
+            batch_window: Tempo máximo, em segundos, para completar um lote
+            workers: Número de lotes processados em paralelo
+            pack_size: Número de itens por requisição empacotada (1 desativa)
+            interactive_workers: Workers reservados à classe 'interactive' (no máximo workers - 1)
+            tenant_weights: Dicionário tenant -> peso na partilha justa
+            default_priority: Classe das requisições que não informam 'priority'
+            deadline_policy: 'drop' ou 'downgrade', para requisições sem 'on_deadline'
+        """
+        self.optimizer = optimizer or PostOptimizer()
+        self.instrumentation = self.optimizer.instrumentation
+        self.scheduler = JobScheduler(queue_size, weights=tenant_weights, instrumentation=self.instrumentation)
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.pack_size = max(1, pack_size)
+        self.workers = max(1, workers)
+        self.interactive_workers = max(0, min(interactive_workers, self.workers - 1))
+        self.default_priority = default_priority
+        self.deadline_policy = deadline_policy
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self):
+        for i in range(self.workers):
+            classes = ('interactive',) if i < self.interactive_workers else PRIORITY_CLASSES
+            thread = threading.Thread(target=self._worker, args=(classes,), name=f"optimizer-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Serviço de otimização iniciado com {self.workers} workers "
+                    f"({self.interactive_workers} reservados às requisições interativas)")
+
+    def stop(self, timeout: float = 30.0):
+        """Para de aceitar requisições e aguarda os workers esvaziarem a fila"""
+        self._stopping.set()
+        self.scheduler.close()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, post: dict, refresh_cache: bool = False, priority: str = None,
+               tenant: str = None, deadline: float = None, on_deadline: str = None) -> Future:
+        """
+        Enfileira um post no formato {'description', 'platform', 'context'}
+
+        Args:
+            priority: Classe de prioridade (padrão: default_priority do serviço)
+            tenant: Tenant/projeto na partilha justa (padrão: o campo 'context' do post)
+            deadline: Prazo em segundos; a requisição que não terminaria a tempo é
+                descartada (DeadlineExceededError) ou rebaixada, conforme on_deadline
+            on_deadline: 'drop' ou 'downgrade' (padrão: deadline_policy do serviço)
+
+        Returns:
+            Future: Resolvido com o resultado no mesmo formato de optimize_post
+
+        Raises:
+            ServiceUnavailableError: Serviço desligando ou quota diária esgotada
+            ServiceOverloadedError: Fila cheia
+        """
+        if self._stopping.is_set():
+            raise ServiceUnavailableError("Serviço em desligamento")
+        if self.optimizer.retry_scheduler.circuit_open:
+            raise ServiceUnavailableError("Quota diária esgotada")
+
+        try:
+            job = self.scheduler.submit(
+                (post, refresh_cache),
+                priority=priority or self.default_priority,
+                tenant=tenant or post.get('context') or None,
+                deadline=deadline,
+                on_deadline=on_deadline or self.deadline_policy
+            )
+        except QueueFullError as e:
+            self.instrumentation.increment('server_rejected_total')
+            raise ServiceOverloadedError(str(e))
+
+        self.instrumentation.increment('server_requests_total')
+        return job.future
+
+    def _worker(self, classes: tuple):
+        while True:
+            job = self.scheduler.next(classes=classes)
+            if job is None:
+                return
+
+            batch = [job]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                job = self.scheduler.next(timeout=max(0.0, deadline - time.monotonic()), classes=classes)
+                if job is None:
+                    break
+                batch.append(job)
+
+            self._process(batch)
+
+    def _process(self, batch: list):
+        """Otimiza um micro-lote e resolve os futures de cada requisição"""
+        now = time.monotonic()
+        for job in batch:
+            self.instrumentation.observe('server_queue_wait_seconds', now - job.enqueued_at)
+        self.instrumentation.increment('server_batches_total')
+
+        # Os mais urgentes primeiro, mesmo que tenham entrado no lote depois
+        batch = sorted(batch, key=lambda job: PRIORITY_CLASSES.index(job.priority))
+
+        # Requisições com refresh_cache diferentes não podem dividir um pacote
+        for refresh_cache in (False, True):
+            jobs = [job for job in batch if job.payload[1] == refresh_cache]
+            for start in range(0, len(jobs), self.pack_size):
+                pack = jobs[start:start + self.pack_size]
+                started = time.monotonic()
+                try:
+                    if len(pack) == 1:
+                        post = pack[0].payload[0]
+                        results = [self.optimizer.optimize_post(
+                            post['description'], post['platform'], post['context'],
+                            refresh_cache=refresh_cache
+                        )]
+                    else:
+                        results = self.optimizer.optimize_packed(
+                            [job.payload[0] for job in pack], refresh_cache=refresh_cache
+                        )
+                except Exception as e:
+                    logger.error(f"Erro ao processar lote: {str(e)}")
+                    for job in pack:
+                        job.future.set_exception(e)
+                    continue
+
+                self.scheduler.record_service(time.monotonic() - started)
+                for job, result in zip(pack, results):
+                    job.future.set_result(result)
+
+    def health(self) -> dict:
+        return {
+            'status': 'stopping' if self._stopping.is_set() else 'ok',
+            'queue_depth': self.scheduler.depth(),
+            'queue_capacity': self.scheduler.capacity,
+            'workers': self.workers,
+            'circuit_open': self.optimizer.retry_scheduler.circuit_open,
+            'scheduler': self.scheduler.scheduler_stats()
+        }
+
+    def to_prometheus(self) -> str:
+        """Métricas do otimizador acrescidas da ocupação da fila, total e por classe"""
+        metric = f"{self.instrumentation.prefix}_server_queue_depth"
+        lines = [f"# TYPE {metric} gauge", f"{metric} {self.scheduler.depth()}"]
+        by_class = f"{metric}_by_priority"
+        lines.append(f"# TYPE {by_class} gauge")
+        for priority in PRIORITY_CLASSES:
+            lines.append(f'{by_class}{{priority="{priority}"}} {self.scheduler.depth(priority)}')
+        return self.instrumentation.to_prometheus() + "\n".join(lines) + "\n"
+
+
+class OptimizationHandler(BaseHTTPRequestHandler):
+    """Handler HTTP; o serviço é acessado por self.server.service"""
+
+    server_version = "PostOptimizer/1.0"
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, self.server.service.health())
+        elif self.path == '/metrics':
+            self._send_text(200, self.server.service.to_prometheus(),
+                            'text/plain; version=0.0.4; charset=utf-8')
+        else:
+            self._send_json(404, {'error': 'Endpoint não encontrado'})
+
+    def do_POST(self):
+        if self.path != '/optimize':
+            self._send_json(404, {'error': 'Endpoint não encontrado'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except (ValueError, json.JSONDecodeError):
+            self._send_json(400, {'error': 'Corpo JSON inválido'})
+            return
+
+        if not isinstance(payload, dict) or not payload.get('description'):
+            self._send_json(400, {'error': "Campo 'description' é obrigatório"})
+            return
+
+        platform = payload.get('platform', 'instagram')
+        if platform not in Config.PROMPTS:
+            self._send_json(400, {'error': f"Plataforma não suportada: {platform}. Use: {', '.join(Config.PROMPTS)}"})
+            return
+
+        priority = payload.get('priority')
+        if priority is not None and priority not in PRIORITY_CLASSES:
+            self._send_json(400, {'error': f"Prioridade inválida: {priority}. Use: {', '.join(PRIORITY_CLASSES)}"})
+            return
+
+        on_deadline = payload.get('on_deadline')
+        if on_deadline is not None and on_deadline not in DEADLINE_POLICIES:
+            self._send_json(400, {'error': f"Política de prazo inválida: {on_deadline}. Use: {', '.join(DEADLINE_POLICIES)}"})
+            return
+
+        try:
+            # Sem prazo explícito, o resultado não serve depois que o cliente desiste de esperar
+            deadline = float(payload.get('deadline') or self.server.request_timeout)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': "Campo 'deadline' deve ser um número de segundos"})
+            return
+
+        post = {
+            'description': payload['description'],
+            'platform': platform,
+            'context': payload.get('context', '')
+        }
+
+        try:
+            future = self.server.service.submit(
+                post,
+                refresh_cache=bool(payload.get('refresh_cache')),
+                priority=priority,
+                tenant=payload.get('tenant'),
+                deadline=deadline,
+                on_deadline=on_deadline
+            )
+            result = future.result(timeout=self.server.request_timeout)
+        except (ServiceOverloadedError, QueueFullError) as e:
+            self._send_json(429, {'error': str(e)}, headers={'Retry-After': '1'})
+            return
+        except DeadlineExceededError as e:
+            self._send_json(504, {'error': str(e)})
+            return
+        except ServiceUnavailableError as e:
+            self._send_json(503, {'error': str(e)}, headers={'Retry-After': '60'})
+            return
+        except FutureTimeoutError:
+            self._send_json(504, {'error': 'Tempo limite excedido aguardando a otimização'})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+
+        self._send_json(200 if result['success'] else 502, result)
+
+    def _send_json(self, status: int, data: dict, headers: dict = None):
+        self._send_text(status, json.dumps(data, ensure_ascii=False),
+                        'application/json; charset=utf-8', headers)
+
+    def _send_text(self, status: int, body: str, content_type: str, headers: dict = None):
+        encoded = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(encoded)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+
+def create_server(service: OptimizationService, host: str, port: int,
+                  request_timeout: float = 120.0) -> ThreadingHTTPServer:
+    """Cria o servidor HTTP ligado ao serviço (que deve ser iniciado separadamente)"""
+    server = ThreadingHTTPServer((host, port), OptimizationHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.request_timeout = request_timeout
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor HTTP do Agente de Otimização de Posts")
+    parser.add_argument('--host', default=Config.SERVER_HOST, help='Endereço de escuta')
+    parser.add_argument('--port', type=int, default=Config.SERVER_PORT, help='Porta de escuta')
+    parser.add_argument('--backend', choices=['gemini', 'pool', 'local'], default=Config.LLM_BACKEND,
+                        help='Backend de geração')
+    parser.add_argument('--queue-size', type=int, default=Config.SERVER_QUEUE_SIZE,
+                        help='Requisições aguardando na fila antes de responder 429')
+    parser.add_argument('--batch-size', type=int, default=Config.SERVER_BATCH_SIZE,
+                        help='Requisições agrupadas por micro-lote')
+    parser.add_argument('--batch-window', type=float, default=Config.SERVER_BATCH_WINDOW,
+                        help='Espera máxima, em segundos, para completar um micro-lote')
+    parser.add_argument('--workers', type=int, default=Config.CONCURRENCY,
+                        help='Micro-lotes processados em paralelo')
+    parser.add_argument('--pack-size', type=int, default=1,
+                        help='Itens por requisição empacotada ao modelo (1 desativa)')
+    parser.add_argument('--timeout', type=float, default=120.0,
+                        help='Tempo máximo de espera por resultado, em segundos (e prazo padrão na fila)')
+    parser.add_argument('--interactive-workers', type=int, default=Config.SCHEDULER_INTERACTIVE_WORKERS,
+                        help="Workers reservados às requisições 'interactive' (no máximo --workers - 1)")
+    parser.add_argument('--default-priority', choices=PRIORITY_CLASSES, default=Config.SCHEDULER_DEFAULT_PRIORITY,
+                        help="Classe das requisições sem 'priority'")
+    parser.add_argument('--deadline-policy', choices=DEADLINE_POLICIES, default=Config.SCHEDULER_DEADLINE_POLICY,
+                        help='Destino das requisições que não terminariam no prazo: descartar ou rebaixar')
+    parser.add_argument('--tenant-weights', default=Config.TENANT_WEIGHTS,
+                        help="Pesos da partilha justa, no formato 'projeto:peso,projeto:peso'")
+    parser.add_argument('--hedge', action='store_true', default=Config.HEDGING,
+                        help='Envia uma cópia das requisições mais lentas que o percentil HEDGE_PERCENTILE')
+    parser.add_argument('--fast-path', choices=['off', 'skip', 'template'], default=Config.FAST_PATH,
+                        help='Destino dos posts que já atendem às regras da plataforma')
+    parser.add_argument('--no-cache', action='store_true', help='Desativa o cache de respostas')
+    parser.add_argument('--no-history', action='store_true',
+                        help='Não grava os resultados no histórico (HISTORY_PATH)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        tenant_weights = parse_weights(args.tenant_weights)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.backend != 'local' and not (Config.GEMINI_API_KEY or (args.backend == 'pool' and Config.GEMINI_API_KEYS)):
+        print("❌ Erro: Chave da API do Gemini não encontrada!")
+        print("Configure GEMINI_API_KEY (ou GEMINI_API_KEYS, para o pool) no arquivo .env")
+        raise SystemExit(1)
+
+    # Clientes em modo --server/SERVER_URL não gravam histórico; o servidor grava por eles
+    history = None
+    if Config.HISTORY and not args.no_history:
+        from history_store import HistoryStore
+
+        history = HistoryStore(Config.HISTORY_PATH)
+
+    service = OptimizationService(
+        PostOptimizer(use_cache=not args.no_cache, backend=create_backend(args.backend), hedging=args.hedge,
+                      fast_path=args.fast_path, history=history),
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        batch_window=args.batch_window,
+        workers=args.workers,
+        pack_size=args.pack_size,
+        interactive_workers=args.interactive_workers,
+        tenant_weights=tenant_weights,
+        default_priority=args.default_priority,
+        deadline_policy=args.deadline_policy
+    )
+    service.start()
+
+    server = create_server(service, args.host, args.port, request_timeout=args.timeout)
+    print(f"🚀 Servidor ouvindo em http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("🛑 Encerrando...")
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
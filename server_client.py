@@ -0,0 +1,152 @@
+import json
+import logging
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from instrumentation import Instrumentation
+from post_optimizer import PostOptimizer
+
+logger = logging.getLogger(__name__)
+
+
+class ServerClient:
+    """
+    Cliente do server.py, com a interface de otimização do PostOptimizer
+
+    Em vez de chamar o modelo diretamente, envia cada post ao servidor, que
+    ordena os pedidos de todos os clientes pelo JobScheduler (prioridade,
+    prazo e partilha justa entre tenants) e divide uma única quota. Assim a
+    interface web (classe 'interactive') e um backfill do cli.py -f (classe
+    'bulk') não disputam a API sem ordem.
+
+    Respostas 429 (fila cheia ou pedido cedido a um mais urgente) são
+    repetidas após o Retry-After; os demais erros viram resultados com
+    success False, como no PostOptimizer.
+    """
+
+    # Sem cache, deduplicação ou histórico locais: o server.py consulta o cache e grava o histórico
+    cache = None
+    deduplicator = None
+
+    def __init__(self, url: str, priority: str = None, tenant: str = None, deadline: float = None,
+                 on_deadline: str = None, timeout: float = 300.0, max_retries: int = 20):
+        """
+        Args:
+            url: Endereço do servidor (ex.: http://127.0.0.1:8000)
+            priority: Classe de prioridade dos pedidos (padrão: a do servidor)
+            tenant: Tenant/projeto na partilha justa (padrão: o campo 'context' do post)
+            deadline: Prazo de cada pedido, em segundos (padrão: o tempo limite do servidor)
+            on_deadline: 'drop' ou 'downgrade' (padrão: a política do servidor)
+            timeout: Espera máxima por uma resposta HTTP, em segundos
+            max_retries: Repetições de um pedido recusado com 429
+        """
+        self.url = url.rstrip('/')
+        self.priority = priority
+        self.tenant = tenant
+        self.deadline = deadline
+        self.on_deadline = on_deadline
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.instrumentation = Instrumentation()
+
+    def optimize_post(self, original_description: str, platform: str = 'instagram',
+                      additional_context: str = "", refresh_cache: bool = False) -> dict:
+        """Otimiza um post pelo servidor; retorna o resultado no formato de PostOptimizer.optimize_post"""
+        payload = {
+            'description': original_description,
+            'platform': platform,
+            'context': additional_context,
+            'refresh_cache': refresh_cache
+        }
+        for key in ('priority', 'tenant', 'deadline', 'on_deadline'):
+            if getattr(self, key) is not None:
+                payload[key] = getattr(self, key)
+
+        start = time.perf_counter()
+        try:
+            result = self._post(payload)
+        except Exception as e:
+            logger.error(f"Erro ao otimizar post pelo servidor: {str(e)}")
+            result = PostOptimizer._error_result(original_description, e)
+
+        self.instrumentation.observe('optimize_post_seconds', time.perf_counter() - start)
+        self.instrumentation.increment('posts_total')
+        if not result.get('success'):
+            self.instrumentation.increment('posts_failed_total')
+        return result
+
+    def _post(self, payload: dict) -> dict:
+        """Envia o pedido, repetindo respostas 429 após o Retry-After"""
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        for attempt in range(self.max_retries + 1):
+            request = urllib.request.Request(
+                f"{self.url}/optimize", data=body,
+                headers={'Content-Type': 'application/json; charset=utf-8'}
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return json.loads(response.read())
+            except urllib.error.HTTPError as e:
+                data = self._read_error(e)
+                if e.code == 502 and 'success' in data:
+                    return data  # o servidor respondeu, mas a otimização falhou
+                if e.code != 429 or attempt == self.max_retries:
+                    raise RuntimeError(f"Servidor respondeu {e.code}: {data.get('error', e.reason)}")
+
+                delay = float(e.headers.get('Retry-After') or 1)
+                self.instrumentation.increment('server_retries_total')
+                logger.info(f"Servidor ocupado ({data.get('error')}); nova tentativa em {delay:g}s")
+                time.sleep(delay)
+
+    @staticmethod
+    def _read_error(error: urllib.error.HTTPError) -> dict:
+        try:
+            data = json.loads(error.read() or b'{}')
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def iter_optimize(self, items, concurrency: int = 1, refresh_cache: bool = False):
+        """
+        Como PostOptimizer.iter_optimize: consome (índice, post) sob demanda, com até
+        `concurrency` pedidos em andamento, e produz (índice, resultado) por plataforma
+        """
+        concurrency = max(1, concurrency)
+        items = iter(
+            (index, item) for index, post in items for item in PostOptimizer._expand_post(post)
+        )
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = {}
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < concurrency:
+                    try:
+                        index, item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    future = executor.submit(
+                        self.optimize_post, item['description'], item['platform'], item['context'], refresh_cache
+                    )
+                    pending[future] = index
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+
+    def batch_optimize(self, posts: list, concurrency: int = 1, refresh_cache: bool = False) -> list:
+        """Otimiza uma lista de posts pelo servidor; resultados na ordem da entrada, um por plataforma"""
+        items = [item for post in posts for item in PostOptimizer._expand_post(post)]
+        results = [None] * len(items)
+        for position, result in self.iter_optimize(enumerate(items), concurrency, refresh_cache):
+            results[position] = result
+        return results
+
+    def stats(self) -> dict:
+        """Latências e contagens dos pedidos deste cliente (a fila fica em GET /health do servidor)"""
+        return self.instrumentation.summary()
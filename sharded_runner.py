@@ -0,0 +1,297 @@
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import time
+
+from streaming import ResultWriter, iter_posts
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _create_exclusive(path: str, content: str = '') -> bool:
+    """Cria o arquivo apenas se ele ainda não existir; retorna False se outro processo chegou antes"""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return True
+
+
+class ShardedRunner:
+    """
+    Processa um arquivo de posts em vários processos, com um único limite de taxa global
+
+    A entrada é dividida uma única vez em blocos de `chunk_size` posts dentro de
+    `workdir`. Cada processo trabalhador pega o próximo bloco livre criando um
+    arquivo de reserva exclusivo (roubo de trabalho: quem termina antes pega
+    mais blocos) e grava os resultados do bloco em JSONL. Todos os processos
+    usam o mesmo FileRateLimiter, então juntos não passam do RPM/TPM
+    configurado. Ao final, os blocos são unidos na ordem da entrada e o
+    diretório de trabalho é removido.
+
+    Outras máquinas que compartilham `workdir` (com suporte a locks de
+    arquivo) podem executar o mesmo comando para ajudar no processamento; o
+    último processo a terminar faz a união.
+    """
+
+    def __init__(self, input_path: str, output_path: str, workdir: str = None,
+                 shards: int = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 options: dict = None, resume: bool = False):
+        """
+        Args:
+            input_path: Arquivo de posts (JSONL ou array JSON)
+            output_path: Arquivo JSONL final, na ordem da entrada
+            workdir: Diretório de trabalho compartilhado (padrão: output_path + '.shards')
+            shards: Número de processos trabalhadores nesta máquina (padrão: número de CPUs)
+            chunk_size: Posts por bloco de trabalho
+            options: Opções do PostOptimizer de cada trabalhador: backend, concurrency,
+                rpm, tpm, use_cache, refresh_cache, hedging, fast_path e
+                history_path (histórico SQLite compartilhado pelos processos)
+            resume: Libera blocos reservados por uma execução interrompida (use só
+                quando nenhum outro processo estiver usando `workdir`)
+        """
+        self.input_path = input_path
+        self.output_path = output_path
+        self.workdir = workdir or output_path + '.shards'
+        self.shards = max(1, shards or os.cpu_count() or 1)
+        self.chunk_size = max(1, chunk_size)
+        self.options = options or {}
+        self.resume = resume
+
+        self.input_dir = os.path.join(self.workdir, 'input')
+        self.claims_dir = os.path.join(self.workdir, 'claims')
+        self.output_dir = os.path.join(self.workdir, 'output')
+        self.rate_limit_path = os.path.join(self.workdir, 'rate_limit.json')
+
+    def run(self) -> dict:
+        """Divide a entrada, processa os blocos em paralelo e une as saídas"""
+        self.prepare()
+
+        # spawn evita herdar threads e conexões SQLite do processo pai
+        context = multiprocessing.get_context('spawn')
+        workers = [
+            context.Process(target=_worker_main, args=(self._worker_config(), shard), daemon=False)
+            for shard in range(self.shards)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        failed = [worker.exitcode for worker in workers if worker.exitcode]
+        if failed:
+            raise RuntimeError(f"{len(failed)} processos trabalhadores falharam")
+
+        return self.merge()
+
+    def prepare(self):
+        """Divide a entrada em blocos, uma única vez, mesmo com várias máquinas"""
+        for directory in (self.input_dir, self.claims_dir, self.output_dir):
+            os.makedirs(directory, exist_ok=True)
+
+        done_marker = os.path.join(self.workdir, 'split.done')
+        if os.path.exists(done_marker):
+            self._check_input(done_marker)
+            # Sem resume, o diretório é de uma execução em andamento (por exemplo, em outra máquina)
+            if self.resume:
+                self._release_stale_claims()
+            return
+
+        if not _create_exclusive(os.path.join(self.workdir, 'split.lock'), self._owner()):
+            # Outra máquina está dividindo a entrada
+            while not os.path.exists(done_marker):
+                time.sleep(0.5)
+            self._check_input(done_marker)
+            return
+
+        chunks = 0
+        chunk_file = None
+        for index, post in iter_posts(self.input_path):
+            if index % self.chunk_size == 0:
+                if chunk_file:
+                    chunk_file.close()
+                chunk_file = open(self._chunk_path(self.input_dir, chunks), 'w', encoding='utf-8')
+                chunks += 1
+            chunk_file.write(json.dumps({'index': index, 'post': post}, ensure_ascii=False) + '\n')
+        if chunk_file:
+            chunk_file.close()
+
+        with open(done_marker, 'w', encoding='utf-8') as f:
+            json.dump({'chunks': chunks, 'input': self._input_signature()}, f)
+        logger.info(f"Entrada dividida em {chunks} blocos de até {self.chunk_size} posts")
+
+    def _input_signature(self) -> dict:
+        """Caminho, tamanho e data de modificação da entrada, gravados em split.done"""
+        stat = os.stat(self.input_path)
+        return {'path': os.path.abspath(self.input_path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def _check_input(self, done_marker: str):
+        """Recusa um diretório de trabalho dividido a partir de outra entrada (ou de outra versão dela)"""
+        with open(done_marker, 'r', encoding='utf-8') as f:
+            recorded = json.load(f).get('input')
+        if recorded != self._input_signature():
+            raise RuntimeError(
+                f"O diretório de trabalho {self.workdir} é de outra entrada "
+                f"({(recorded or {}).get('path', 'desconhecida')}); apague-o ou use outro --shard-dir"
+            )
+
+    def _release_stale_claims(self):
+        """Ao retomar, libera reservas de blocos sem saída concluída e uma união interrompida"""
+        for name in os.listdir(self.claims_dir):
+            if not os.path.exists(os.path.join(self.output_dir, name)):
+                os.remove(os.path.join(self.claims_dir, name))
+
+        merge_lock = os.path.join(self.workdir, 'merge.lock')
+        if os.path.exists(merge_lock):
+            os.remove(merge_lock)
+
+    def chunk_count(self) -> int:
+        """Número de blocos da entrada; 0 se o diretório já foi removido após a união"""
+        try:
+            with open(os.path.join(self.workdir, 'split.done'), 'r', encoding='utf-8') as f:
+                return json.load(f)['chunks']
+        except FileNotFoundError:
+            return 0
+
+    def claim_next(self, owner: str):
+        """Reserva o próximo bloco livre; retorna o número do bloco ou None se não houver mais"""
+        for chunk in range(self.chunk_count()):
+            name = os.path.basename(self._chunk_path(self.claims_dir, chunk))
+            if os.path.exists(os.path.join(self.claims_dir, name)):
+                continue
+            if _create_exclusive(os.path.join(self.claims_dir, name), owner):
+                return chunk
+        return None
+
+    def process_chunk(self, optimizer, chunk: int):
+        """Otimiza um bloco e publica a saída de forma atômica"""
+        def items():
+            # Um item por plataforma, identificado por (índice do post, posição da plataforma)
+            with open(self._chunk_path(self.input_dir, chunk), 'r', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    for position, item in enumerate(optimizer._expand_post(record['post'])):
+                        yield (record['index'], position), item
+
+        # Dentro do bloco os resultados chegam fora de ordem; o bloco é pequeno, então ordena em
+        # memória, pelo post e pela ordem das plataformas, para a saída não depender das threads
+        results = sorted(
+            optimizer.iter_optimize(
+                items(),
+                concurrency=self.options.get('concurrency', 1),
+                refresh_cache=self.options.get('refresh_cache', False)
+            ),
+            key=lambda item: item[0]
+        )
+        results = [(index, result) for (index, _), result in results]
+
+        final_path = self._chunk_path(self.output_dir, chunk)
+        tmp_path = final_path + '.tmp'
+        with ResultWriter(tmp_path) as writer:
+            for index, result in results:
+                writer.write(index, result)
+        os.replace(tmp_path, final_path)
+        return results
+
+    def merge(self) -> dict:
+        """
+        Une as saídas dos blocos na ordem da entrada
+
+        Returns:
+            dict: Totais de posts, sucessos e blocos; 'merged' é False se ainda
+                houver blocos em andamento (em outra máquina) ou se outro
+                processo fez a união
+        """
+        if not os.path.exists(os.path.join(self.workdir, 'split.done')):
+            # Outro processo já uniu os blocos e removeu o diretório
+            return {'merged': False, 'chunks': 0, 'pending_chunks': 0}
+
+        chunks = self.chunk_count()
+        pending = [
+            chunk for chunk in range(chunks)
+            if not os.path.exists(self._chunk_path(self.output_dir, chunk))
+        ]
+        if pending:
+            return {'merged': False, 'chunks': chunks, 'pending_chunks': len(pending)}
+
+        # Só um processo faz a união
+        if not _create_exclusive(os.path.join(self.workdir, 'merge.lock'), self._owner()):
+            return {'merged': False, 'chunks': chunks, 'pending_chunks': 0}
+
+        posts = successes = 0
+        tmp_path = self.output_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as output:
+            for chunk in range(chunks):
+                with open(self._chunk_path(self.output_dir, chunk), 'r', encoding='utf-8') as f:
+                    for line in f:
+                        output.write(line)
+                        posts += 1
+                        successes += json.loads(line).get('success', False)
+        os.replace(tmp_path, self.output_path)
+
+        # Uma nova execução com a mesma saída começa do zero, sem reaproveitar blocos nem o merge.lock
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+        return {'merged': True, 'chunks': chunks, 'posts': posts, 'successes': successes}
+
+    def _worker_config(self) -> dict:
+        return {
+            'input_path': self.input_path,
+            'output_path': self.output_path,
+            'workdir': self.workdir,
+            'chunk_size': self.chunk_size,
+            'options': self.options
+        }
+
+    @staticmethod
+    def _chunk_path(directory: str, chunk: int) -> str:
+        return os.path.join(directory, f"chunk-{chunk:06d}.jsonl")
+
+    @staticmethod
+    def _owner() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _worker_main(config: dict, shard: int):
+    """Processo trabalhador: reserva e processa blocos até não restar nenhum"""
+    from backends import create_backend
+    from history_store import HistoryStore
+    from post_optimizer import PostOptimizer
+    from rate_limiter import FileRateLimiter
+
+    logging.basicConfig(level=logging.WARNING)
+    runner = ShardedRunner(
+        config['input_path'], config['output_path'], config['workdir'],
+        chunk_size=config['chunk_size'], options=config['options']
+    )
+    options = runner.options
+    optimizer = PostOptimizer(
+        rate_limiter=FileRateLimiter(
+            runner.rate_limit_path,
+            requests_per_minute=options.get('rpm', 0),
+            tokens_per_minute=options.get('tpm', 0)
+        ),
+        use_cache=options.get('use_cache', True),
+        backend=create_backend(options.get('backend')),
+        hedging=options.get('hedging', False),
+        fast_path=options.get('fast_path'),
+        history=HistoryStore(options['history_path']) if options.get('history_path') else None
+    )
+
+    owner = f"{runner._owner()}#{shard}"
+    while True:
+        chunk = runner.claim_next(owner)
+        if chunk is None:
+            return
+        start = time.perf_counter()
+        results = runner.process_chunk(optimizer, chunk)
+        successes = sum(1 for _, result in results if result['success'])
+        print(f"✅ Shard {shard}: bloco {chunk} concluído ({successes}/{len(results)} posts, "
+              f"{time.perf_counter() - start:.1f}s)\n", end='', flush=True)
@@ -0,0 +1,57 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalescência de chamadas idênticas em andamento
+
+    Enquanto uma chamada com determinada chave está em execução, outras threads
+    que pedem a mesma chave aguardam e recebem o mesmo resultado (ou a mesma
+    exceção), em vez de repetir o trabalho. Depois que a chamada termina a chave
+    é liberada: não há cache de resultados, apenas compartilhamento do que já
+    está em andamento.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {'calls': 0, 'shared': 0}
+
+    def do(self, key, function):
+        """
+        Executa function() uma única vez para chamadas simultâneas com a mesma chave
+
+        Args:
+            key: Chave hashable que identifica chamadas equivalentes
+            function: Função sem argumentos executada pelo primeiro chamador
+
+        Returns:
+            tuple: (resultado, compartilhado), onde compartilhado indica que o
+                resultado veio de uma chamada iniciada por outro chamador
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.stats['calls'] += 1
+            else:
+                self.stats['shared'] += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(function())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+        return future.result(), False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
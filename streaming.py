@@ -0,0 +1,135 @@
+import json
+import os
+
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_posts(path: str):
+    """
+    Lê posts de um arquivo sem carregá-lo inteiro em memória
+
+    Aceita JSONL (um objeto por linha) ou um array JSON, que é decodificado
+    incrementalmente objeto por objeto.
+
+    Yields:
+        tuple: (índice, post)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        first = _peek_first_char(f)
+        if first == '[':
+            yield from enumerate(_iter_json_array(f))
+        else:
+            index = 0
+            for line in f:
+                if line.strip():
+                    yield index, json.loads(line)
+                    index += 1
+
+
+def _peek_first_char(f) -> str:
+    """Retorna o primeiro caractere não branco do arquivo e volta ao início"""
+    while True:
+        char = f.read(1)
+        if not char or not char.isspace():
+            break
+    f.seek(0)
+    return char
+
+
+def _iter_json_array(f):
+    """Decodifica os elementos de um array JSON conforme o arquivo é lido"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(CHUNK_SIZE).lstrip()[1:]  # descarta o '['
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+
+        if buffer.startswith(']'):
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+
+        yield obj
+        buffer = buffer[end:]
+
+
+class Checkpoint:
+    """
+    Controle de progresso de um processamento em streaming
+
+    O próprio arquivo de saída JSONL serve de checkpoint: cada linha traz o
+    índice do post de entrada e a plataforma, e apenas resultados
+    bem-sucedidos contam como concluídos. Ao retomar, linhas com erro ou
+    truncadas por uma interrupção são descartadas para que esses posts (ou
+    apenas as plataformas que faltaram) sejam processados de novo.
+    """
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.completed = set()
+
+    def load(self) -> set:
+        """Compacta o arquivo de saída e retorna os pares (índice, plataforma) já concluídos"""
+        if not os.path.exists(self.output_path):
+            return self.completed
+
+        tmp_path = self.output_path + '.tmp'
+        with open(self.output_path, 'r', encoding='utf-8') as src, \
+                open(tmp_path, 'w', encoding='utf-8') as dst:
+            for line in src:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # linha parcial de uma execução interrompida
+                if result.get('success') and 'index' in result:
+                    self.completed.add((result['index'], result.get('platform')))
+                    dst.write(line if line.endswith('\n') else line + '\n')
+
+        os.replace(tmp_path, self.output_path)
+        return self.completed
+
+    def pending(self, posts):
+        """
+        Filtra posts de iter_posts, mantendo só as plataformas ainda não concluídas
+
+        Yields:
+            tuple: (índice, post), com 'platforms' reduzida às plataformas que faltam
+        """
+        for index, post in posts:
+            platforms = post.get('platforms') or [post.get('platform', 'instagram')]
+            remaining = [platform for platform in platforms if (index, platform) not in self.completed]
+            if len(remaining) == len(platforms):
+                yield index, post
+            elif remaining:
+                yield index, dict(post, platforms=remaining)
+
+
+class ResultWriter:
+    """Grava cada resultado em JSONL assim que ele fica pronto"""
+
+    def __init__(self, path: str, append: bool = False):
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, index: int, result: dict):
+        record = {'index': index}
+        record.update(result)
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()